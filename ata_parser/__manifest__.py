@@ -20,13 +20,20 @@
 
     # any module necessary for this one to work correctly
     'depends': ['base',
+                'bus',
                 'hr'],
 
     # always loaded
     'data': [
         'security/ir.model.access.csv',
+        'security/ata_parser_security.xml',
+        'data/ir_cron_data.xml',
+        'views/import_run_views.xml',
+        'views/bitrix_portal_views.xml',
         'wizard/parser_bitrix_import_views.xml',
+        'views/bitrix_import_job_views.xml',
         'views/parser_bitrix_import_menu.xml',
+        'views/hr_employee_views.xml',
     ],
     # only loaded in demonstration mode
     'demo': [
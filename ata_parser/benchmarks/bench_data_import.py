@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+""" Time the stages of ata_parser.data_import on synthetic rows: each stage
+in isolation (mapping, plan, date/float parsing, multi-mapping, fallback
+values) and the whole import end to end, loaded in a test database then
+rolled back.
+
+    python ata_parser/benchmarks/bench_data_import.py -c odoo.conf -d bench --sizes 1000,100000
+    python ata_parser/benchmarks/bench_data_import.py -c odoo.conf -d bench --mixes multi \\
+        --output after.json --compare before.json
+    python ata_parser/benchmarks/bench_data_import.py -c odoo.conf -d bench --model res.partner \\
+        --columns name:char,date:date,partner_latitude:float
+
+The database needs the ata_parser module installed.
+"""
+import datetime
+import random
+
+from common import argument_parser, bootstrap, emit_results, get_env, measure
+
+# column mixes: model, (field, kind of generated values) of each column, import options
+MIXES = {
+    'dates': ('hr.employee', [
+        ('name', 'char'), ('birthday', 'date'), ('departure_date', 'date'), ('visa_expire', 'date'),
+    ], {}),
+    'floats': ('res.partner', [
+        ('name', 'char'), ('partner_latitude', 'float'), ('partner_longitude', 'float'),
+    ], {'float_thousand_separator': ' ', 'float_decimal_separator': ','}),
+    'currency': ('res.partner', [
+        ('name', 'char'), ('partner_latitude', 'currency'), ('partner_longitude', 'currency'),
+    ], {'float_thousand_separator': ',', 'float_decimal_separator': '.'}),
+    'multi': ('hr.employee', [
+        ('name', 'char'), ('name', 'char'), ('notes', 'text'), ('notes', 'text'),
+        ('category_ids', 'many2many'), ('category_ids', 'many2many'),
+    ], {'name_create_enabled_fields': {'category_ids': True}}),
+    'fallback': ('hr.employee', [
+        ('name', 'char'), ('gender', 'selection'), ('marital', 'selection'),
+    ], {}),
+}
+KINDS = ('char', 'text', 'many2many', 'date', 'float', 'currency', 'selection')
+DEFAULT_OPTIONS = {
+    'skip': 0,
+    'limit': None,
+    'date_format': '%d-%m-%Y',
+    'datetime_format': '%d-%m-%Y %H:%M:%S',
+    'float_thousand_separator': ',',
+    'float_decimal_separator': '.',
+    'fallback_values': {},
+    'name_create_enabled_fields': {},
+    'import_set_empty_fields': [],
+    'import_skip_records': [],
+    'has_headers': False,
+}
+DATE_ORIGIN = datetime.date(1970, 1, 1)
+
+
+class RowFactory:
+    """ Generate the values of the columns of a mix, drawing each value
+    among ``distinct`` ones so the per-value caches of the parsers see a
+    realistic hit rate.
+    """
+
+    def __init__(self, env, model, columns, options, distinct, seed):
+        self.rnd = random.Random(seed)
+        self.columns = columns
+        self.options = options
+        self.distinct = distinct
+        self.currency = env.company.currency_id.symbol
+        self.selections = {}
+        for field, kind in columns:
+            if kind == 'selection':
+                # an invalid value every few rows, for the fallback value to replace
+                labels = [label for _key, label in env[model].fields_get([field])[field]['selection']]
+                self.selections[field] = labels + ['Unknown']
+
+    def make_value(self, field, kind, column):
+        n = self.rnd.randrange(self.distinct)
+        if kind == 'date':
+            return (DATE_ORIGIN + datetime.timedelta(days=n * 7)).strftime(self.options['date_format'])
+        if kind in ('float', 'currency'):
+            value = '{:,.2f}'.format(n * 13.37).replace(',', '\0')
+            value = value.replace('.', self.options['float_decimal_separator'])
+            value = value.replace('\0', self.options['float_thousand_separator'])
+            return '%s %s' % (self.currency, value) if kind == 'currency' else value
+        if kind == 'selection':
+            return self.rnd.choice(self.selections[field])
+        if kind == 'many2many':
+            return 'Tag %d' % (n % 10)
+        return '%s %d-%d' % (field, column, n)
+
+    def make_rows(self, size):
+        return [[self.make_value(field, kind, column) for column, (field, kind) in enumerate(self.columns)]
+                for _i in range(size)]
+
+
+def get_options(model, columns, mix_options, env):
+    options = dict(DEFAULT_OPTIONS, **mix_options)
+    fallback_values = {}
+    for field, kind in columns:
+        if kind == 'selection':
+            selection = env[model].fields_get([field])[field]['selection']
+            fallback_values[field] = {
+                'fallback_value': selection[0][0],
+                'field_model': model,
+                'field_type': 'selection',
+            }
+    options['fallback_values'] = fallback_values
+    return options
+
+
+def bench_mix(env, name, model, columns, options, size, args):
+    importer = env['ata_parser.data_import'].create({'res_model': model})
+    factory = RowFactory(env, model, columns, options, args.distinct, args.seed)
+    rows = factory.make_rows(size)
+    fields = [field for field, _kind in columns]
+    repeat = args.repeat if size < 1000000 else 1
+    results = []
+
+    def add(stage, seconds, rows_count):
+        results.append({
+            'name': '%s[%d].%s' % (name, size, stage),
+            'seconds': seconds,
+            'rows': rows_count,
+            'rows_per_sec': round(rows_count / seconds) if seconds else None,
+        })
+
+    seconds, (data, import_fields) = measure(
+        lambda: importer._map_import_data(rows, fields, options), repeat)
+    add('map', seconds, len(data))
+
+    seconds, plan = measure(lambda: importer._compile_import_plan(import_fields, options), repeat)
+    add('plan', seconds, len(data))
+
+    # parsing converts the rows in place: each run parses a fresh copy
+    seconds, parsed = measure(
+        lambda copy: importer._parse_import_data(copy, import_fields, options, plan), repeat,
+        setup=lambda: [list(row) for row in data])
+    add('parse', seconds, len(parsed))
+
+    seconds, (merged, load_fields) = measure(
+        lambda: importer._handle_multi_mapping(parsed, import_fields, plan), repeat)
+    add('multi_mapping', seconds, len(merged))
+
+    if options['fallback_values']:
+        seconds, merged = measure(
+            lambda copy: importer._handle_fallback_values(load_fields, copy, options['fallback_values'], plan),
+            repeat, setup=lambda: [list(row) for row in merged])
+        add('fallback', seconds, len(merged))
+
+    if size <= args.load_max:
+        def import_rows():
+            import_result = importer.execute_import(rows, fields, fields, options, dryrun=True)
+            errors = [m for m in import_result['messages'] if isinstance(m, dict) and m.get('type') == 'error']
+            if errors:
+                raise SystemExit("%s: the import failed: %s" % (name, errors[0]['message']))
+            return import_result
+        seconds, import_result = measure(import_rows, repeat)
+        add('end_to_end', seconds, len(import_result['ids'] or []))
+
+    return results
+
+
+def parse_columns(spec):
+    columns = []
+    for column in spec.split(','):
+        field, _sep, kind = column.partition(':')
+        if kind not in KINDS:
+            raise SystemExit("column %r: the kind must be one of %s" % (column, ', '.join(KINDS)))
+        columns.append((field, kind))
+    return columns
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--sizes', default='1000,100000,1000000', help="comma separated numbers of rows")
+    parser.add_argument('--mixes', default=','.join(MIXES), help="comma separated column mixes (%s)" % ', '.join(MIXES))
+    parser.add_argument('--model', help="model of a custom mix, with --columns")
+    parser.add_argument('--columns', help="custom mix: comma separated field:kind (%s)" % ', '.join(KINDS))
+    parser.add_argument('--distinct', type=int, default=1000, help="distinct values per column")
+    parser.add_argument('--load-max', type=int, default=100000,
+                        help="largest size imported end to end in the database")
+    parser.add_argument('--seed', type=int, default=0)
+    args = bootstrap(parser)
+
+    import odoo
+    env = get_env(odoo.tools.config['db_name'])
+
+    mixes = {name: MIXES[name] for name in args.mixes.split(',') if name}
+    if args.columns:
+        mixes = {'custom': (args.model or 'hr.employee', parse_columns(args.columns), {})}
+
+    results = []
+    try:
+        for name, (model, columns, mix_options) in mixes.items():
+            options = get_options(model, columns, mix_options, env)
+            for size in map(int, args.sizes.split(',')):
+                results.extend(bench_mix(env, name, model, columns, options, size, args))
+    finally:
+        env.cr.rollback()
+        env.cr.close()
+
+    emit_results(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+""" Compare the BeautifulSoup backend of ParserBitrix with the single pass
+grid extractor (on lxml and on html.parser) on saved pages of the employee
+list, or on a synthetic one.
+
+    python ata_parser/benchmarks/bench_grid_extractor.py -c odoo.conf page-1.html page-2.html
+    python ata_parser/benchmarks/bench_grid_extractor.py -c odoo.conf --rows 2000
+"""
+import types
+
+from common import argument_parser, bootstrap, emit_results, make_grid_page, measure
+
+
+def parse_page(parser_class, backend, html):
+    parser = parser_class()
+    parser.backend = backend
+    parser.request = types.SimpleNamespace(text=html, status_code=200)
+    rows = parser.get_content()
+    return parser.titles, rows
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('pages', nargs='*', help="saved HTML pages of the Bitrix employee list")
+    parser.add_argument('--rows', type=int, default=1000, help="rows of the synthetic page")
+    args = bootstrap(parser)
+
+    from odoo.addons.ata_parser.wizard.parser_bitrix_import import ParserBitrix
+
+    pages = []
+    for path in args.pages:
+        with open(path, encoding='utf-8') as f:
+            pages.append((path, f.read()))
+    if not pages:
+        pages.append(('synthetic-%d' % args.rows, make_grid_page(args.rows)))
+
+    results = []
+    for name, html in pages:
+        size = len(html.encode('utf-8'))
+        outputs = {}
+        for backend in ('bs4', 'html.parser', 'lxml'):
+            seconds, outputs[backend] = measure(lambda: parse_page(ParserBitrix, backend, html), args.repeat)
+            rows = len(outputs[backend][1])
+            results.append({
+                'name': '%s[%s]' % (name, backend),
+                'seconds': seconds,
+                'rows': rows,
+                'rows_per_sec': round(rows / seconds) if seconds else None,
+                'mb_per_sec': round(size / seconds / 2 ** 20, 2) if seconds else None,
+            })
+        for backend in ('html.parser', 'lxml'):
+            if outputs[backend] != outputs['bs4']:
+                raise SystemExit("%s: the %s backend does not produce the same rows as bs4" % (name, backend))
+
+    emit_results(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+""" Measure the parsing throughput of ParserBitrix offline, on pages
+recorded once from the portal or on synthetic ones, replayed from the disk
+or through a local HTTP server.
+
+Record the employee list once (the only run needing the network):
+
+    python ata_parser/benchmarks/bench_parser_replay.py -c odoo.conf fixtures/ --record \\
+        --login user --password secret
+
+Benchmark it, and check the parsed rows did not change since --update-digest:
+
+    python ata_parser/benchmarks/bench_parser_replay.py -c odoo.conf fixtures/ --check
+    python ata_parser/benchmarks/bench_parser_replay.py -c odoo.conf --synthetic 10 --rows 2000 --via disk,http
+"""
+import hashlib
+import json
+import tempfile
+import tracemalloc
+
+from common import argument_parser, bootstrap, emit_results, make_grid_page, make_pager, measure
+
+
+def write_synthetic_fixtures(fixtures, pages, rows, seed, with_pager=True):
+    for page in range(1, pages + 1):
+        pager = make_pager(page, pages, pages * rows) if with_pager and pages > 1 else ''
+        html = make_grid_page(rows, start=(page - 1) * rows, seed=seed, pager=pager)
+        fixtures.write_page(page, html.encode('utf-8'), url='https://example.com/company/')
+    fixtures.save()
+
+
+def make_parser(parser_class, fixtures, backend, via, server, workers):
+    parser = parser_class()
+    parser.backend = backend
+    parser.workers = workers
+    parser.pages = max(map(int, fixtures.index['pages']))
+    if via == 'http':
+        parser.url = server.url
+    else:
+        parser.replay_fixtures = fixtures
+    return parser
+
+
+def parse_all(parser):
+    rows = list(parser.iter_rows())
+    return parser.titles, rows
+
+
+def get_digest(titles, rows):
+    return hashlib.sha1(json.dumps([titles, rows], ensure_ascii=False).encode()).hexdigest()
+
+
+def measure_peak_memory(func):
+    """ Peak of the Python allocations (KiB) during a call of ``func`` """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('fixtures', nargs='?', help="directory of the recorded pages")
+    parser.add_argument('--record', action='store_true', help="fetch the pages from the portal into the directory")
+    parser.add_argument('--url', help="employee list to record, default: the one of ParserBitrix")
+    parser.add_argument('--login', default='')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--synthetic', type=int, default=0, help="write this number of synthetic pages")
+    parser.add_argument('--rows', type=int, default=1000, help="rows of each synthetic page")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-pager', action='store_true', help="synthetic pages without pager")
+    parser.add_argument('--backends', default='html.parser,lxml', help="comma separated parser backends")
+    parser.add_argument('--via', default='disk', help="comma separated: disk (replay session), http (local server)")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--check', action='store_true', help="fail if the rows differ from the saved digest")
+    parser.add_argument('--update-digest', action='store_true', help="save the digest of the parsed rows")
+    args = bootstrap(parser)
+
+    from odoo.addons.ata_parser.wizard.parser_bitrix_import import ParserBitrix
+    from odoo.addons.ata_parser.wizard.parser_bitrix_replay import FixtureServer, PageFixtures
+
+    fixtures = PageFixtures(args.fixtures or tempfile.mkdtemp(prefix='bitrix-fixtures-'))
+
+    if args.record:
+        recorder = ParserBitrix()
+        recorder.url = args.url or recorder.url
+        recorder.login = args.login
+        recorder.passwd = args.password
+        recorder.record_fixtures = fixtures
+        recorder.do_parse()
+        print("recorded %d pages, %d rows in %s" % (len(fixtures.index['pages']), len(recorder.data), fixtures.path))
+    elif args.synthetic:
+        write_synthetic_fixtures(fixtures, args.synthetic, args.rows, args.seed, not args.no_pager)
+    if not fixtures.index['pages']:
+        raise SystemExit("no recorded pages in %s, use --record or --synthetic" % fixtures.path)
+
+    size = sum(page['bytes'] for page in fixtures.index['pages'].values())
+    results = []
+    digests = set()
+    with FixtureServer(fixtures) as server:
+        for via in args.via.split(','):
+            for backend in args.backends.split(','):
+                def run():
+                    return parse_all(make_parser(ParserBitrix, fixtures, backend, via, server, args.workers))
+                seconds, (titles, rows) = measure(run, args.repeat)
+                digests.add(get_digest(titles, rows))
+                results.append({
+                    'name': '%s[%s,%s]' % (fixtures.path, via, backend),
+                    'seconds': seconds,
+                    'rows': len(rows),
+                    'rows_per_sec': round(len(rows) / seconds) if seconds else None,
+                    'mb_per_sec': round(size / seconds / 2 ** 20, 2) if seconds else None,
+                    'peak_kib': measure_peak_memory(run),
+                })
+
+    if len(digests) > 1:
+        raise SystemExit("the backends do not produce the same rows")
+    digest = digests.pop()
+    if args.check and fixtures.index.get('digest') not in (None, digest):
+        raise SystemExit("the parsed rows changed since the digest was saved")
+    if args.update_digest:
+        fixtures.index['digest'] = digest
+        fixtures.save()
+
+    emit_results(results, args)
+
+
+if __name__ == '__main__':
+    main()
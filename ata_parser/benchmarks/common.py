@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+""" Helpers shared by the ata_parser benchmark scripts.
+
+The scripts are not part of the Odoo module: they are run from a shell with
+the usual odoo command line options, e.g.::
+
+    python ata_parser/benchmarks/bench_grid_extractor.py -c odoo.conf --rows 5000
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+GRID_TITLES = [
+    '', 'Фото', "Ім'я та прізвище", "Ім'я", 'Прізвище', 'По батькові', 'E-Mail',
+    'Дата реєстрації', 'Дата народження', 'Стать', 'Мобільний телефон', 'Місто',
+    'Робочий телефон', 'Посада', 'Підрозділ', 'Внутрішній телефон', 'ІПН', 'Skype',
+    'Дата прийняття на роботу', '',
+]
+MONTHS = ['січня', 'лютого', 'березня', 'квітня', 'травня', 'червня',
+          'липня', 'серпня', 'вересня', 'жовтня', 'листопада', 'грудня']
+
+
+def bootstrap(parser):
+    """ Parse the benchmark arguments, the remaining ones are given to the
+    odoo configuration so the ``odoo.addons`` namespace can be imported.
+    """
+    args, odoo_args = parser.parse_known_args()
+    import odoo
+    odoo.tools.config.parse_config(odoo_args)
+    odoo.modules.module.initialize_sys_path()
+    return args
+
+
+def get_env(dbname):
+    import odoo
+    from odoo import api, SUPERUSER_ID
+    registry = odoo.registry(dbname)
+    cr = registry.cursor()
+    return api.Environment(cr, SUPERUSER_ID, {})
+
+
+def argument_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON results of a previous run to compare with")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measure, the best one is kept")
+    return parser
+
+
+def measure(func, repeat=3, setup=None):
+    """ Best wall time of ``repeat`` calls of ``func``, and its last result.
+    With ``setup``, ``func`` is given the result of ``setup()``, which is
+    called before each run and not timed.
+    """
+    best = None
+    result = None
+    for _i in range(repeat):
+        if setup:
+            arg = setup()
+            start = time.perf_counter()
+            result = func(arg)
+        else:
+            start = time.perf_counter()
+            result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def make_grid_cell(title, index, rnd):
+    if title == 'Фото':
+        content = ('<div class="intranet-user-list-userpic">'
+                   '<i style="background-image: url(\'https://example.com/upload/%d.jpg\')"></i></div>' % index)
+    elif title == "Ім'я та прізвище":
+        content = '<a href="/company/personal/user/%d/">Employee %d Surname</a>' % (index, index)
+    elif title == 'E-Mail':
+        content = '<a href="mailto:employee%d@example.com">employee%d@example.com</a>' % (index, index)
+    elif title == 'Дата народження':
+        content = '%d %s' % (rnd.randint(1, 28), rnd.choice(MONTHS))
+    elif title.startswith('Дата'):
+        content = '%02d.%02d.%d 10:00:00' % (rnd.randint(1, 28), rnd.randint(1, 12), rnd.randint(2005, 2022))
+    elif title == 'Стать':
+        content = rnd.choice(['чоловіча', 'жіноча', ''])
+    elif title == 'Посада':
+        content = 'Position %d' % rnd.randint(1, 20)
+    elif title == 'Підрозділ':
+        content = 'Department %d' % rnd.randint(1, 8)
+    elif 'телефон' in title:
+        content = '+380 44 %03d %04d' % (rnd.randint(0, 999), rnd.randint(0, 9999))
+    elif title:
+        content = '%s &amp; %d' % (title, index)
+    else:
+        content = ''
+    return ('<td class="main-grid-cell main-grid-cell-left"><div class="main-grid-cell-inner">'
+            '<span class="main-grid-cell-content">%s</span></div></td>' % content)
+
+
+def make_pager(page, pages, total=None):
+    """ Pager of the grid: links to the pages around ``page`` and to the last one """
+    links = ''.join(
+        '<span class="main-ui-pagination-page main-ui-pagination-active">%d</span>' % number if number == page else
+        '<a class="main-ui-pagination-page" href="/company/?page=page-%d">%d</a>' % (number, number)
+        for number in sorted({1, pages} | set(range(max(page - 2, 1), min(page + 2, pages) + 1)))
+    )
+    html = ('<div class="main-ui-pagination"><div class="main-ui-pagination-pages">%s</div>'
+            '<a class="main-ui-pagination-arrow main-ui-pagination-next" href="/company/?page=page-%d">Next</a>'
+            '</div>' % (links, min(page + 1, pages)))
+    if total is not None:
+        html += ('<div class="main-grid-panel-cell"><span class="main-grid-panel-content-title">Total:</span>'
+                 '<span class="main-grid-panel-content-text">%d</span></div>' % total)
+    return html
+
+
+def make_grid_page(rows, start=0, seed=0, titles=GRID_TITLES, pager=''):
+    """ Synthetic page with the markup of the Bitrix ``main-grid`` employee list,
+    ``pager`` is inserted after the grid (see :func:`make_pager`)
+    """
+    rnd = random.Random(seed + start)
+    head = ''.join(
+        '<th class="main-grid-cell-head main-grid-cell-left"><div class="main-grid-cell-inner">'
+        '<span class="main-grid-cell-head-container"><span class="main-grid-head-title">%s</span>'
+        '</span></div></th>' % title if title else
+        '<th class="main-grid-cell-head main-grid-cell-checkbox"><div class="main-grid-cell-inner">'
+        '<input type="checkbox"></div></th>'
+        for title in titles
+    )
+    body = ''.join(
+        '<tr class="main-grid-row main-grid-row-body" data-id="%d">%s</tr>\n' % (
+            index, ''.join(make_grid_cell(title, index, rnd) for title in titles))
+        for index in range(start, start + rows)
+    )
+    return ('<!DOCTYPE html><html><head><title>Employees</title>'
+            '<script>var grid = "<td class=\'main-grid-cell\'>";</script></head><body>'
+            '<div class="main-grid"><table class="main-grid-table"><thead>'
+            '<tr class="main-grid-row-head">%s</tr></thead><tbody>\n%s</tbody></table></div>%s'
+            '</body></html>' % (head, body, pager))
+
+
+def emit_results(results, args):
+    """ Print the results, compare them with a previous run and save them """
+    payload = {
+        'python': platform.python_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r['name']: r for r in json.load(f)['results']}
+
+    for result in results:
+        line = '%-50s %10.4fs' % (result['name'], result['seconds'])
+        previous = baseline.get(result['name'])
+        if previous and previous['seconds']:
+            line += '  (%+.1f%% vs baseline)' % ((result['seconds'] / previous['seconds'] - 1) * 100)
+        for key, value in result.items():
+            if key not in ('name', 'seconds'):
+                line += '  %s=%s' % (key, value)
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(payload, f, indent=2)
+    else:
+        json.dump(payload, sys.stdout, indent=2)
+        print()
@@ -1 +1,6 @@
 from . import data_import
+from . import res_currency
+from . import hr_employee
+from . import bitrix_import_job
+from . import import_run
+from . import bitrix_portal
@@ -0,0 +1,138 @@
+import json
+import logging
+import time
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# seconds between two progress updates of a running job
+PROGRESS_INTERVAL = 2.0
+
+
+class BitrixImportProgress:
+    """ Progress callback of a running job: counts the pages fetched, rows
+    parsed and rows loaded, and writes them on the job at most every
+    ``interval`` seconds.
+
+    The import itself runs in the transaction of the job, which is only
+    committed at the end: the counters are written through a cursor of their
+    own so that they can be seen while the import is running.
+    """
+
+    def __init__(self, job, interval=PROGRESS_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self.pages_fetched = 0
+        self.rows_parsed = 0
+        self.rows_loaded = 0
+        self.written_at = 0.0
+
+    def __call__(self, pages=0, rows=0, loaded=0):
+        self.pages_fetched += pages
+        self.rows_parsed += rows
+        self.rows_loaded += loaded
+        if time.monotonic() - self.written_at >= self.interval:
+            self.flush()
+
+    def get_values(self):
+        return {
+            'pages_fetched': self.pages_fetched,
+            'rows_parsed': self.rows_parsed,
+            'rows_loaded': self.rows_loaded,
+        }
+
+    def flush(self):
+        self.written_at = time.monotonic()
+        with self.job.pool.cursor() as cr:
+            self.job.with_env(self.job.env(cr=cr, su=True)).write(self.get_values())
+
+
+class BitrixImportJob(models.Model):
+    _name = 'ata_parser.bitrix_import_job'
+    _description = 'Bitrix import job'
+    _order = 'id desc'
+
+    name = fields.Char('Name', required=True, readonly=True, default='Bitrix import')
+    user_id = fields.Many2one('res.users', 'Requested by', required=True, readonly=True,
+                              default=lambda self: self.env.user)
+    dryrun = fields.Boolean('Test only', readonly=True)
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], 'Status', required=True, readonly=True, default='queued')
+    # wizard values, credentials included: only kept until the job runs
+    wizard_values = fields.Text('Wizard values', groups='base.group_system')
+    date_start = fields.Datetime('Started', readonly=True)
+    date_end = fields.Datetime('Finished', readonly=True)
+    pages_fetched = fields.Integer('Pages fetched', readonly=True)
+    rows_parsed = fields.Integer('Rows parsed', readonly=True)
+    rows_loaded = fields.Integer('Rows loaded', readonly=True)
+    message = fields.Text('Message', readonly=True)
+    run_id = fields.Many2one('ata_parser.import_run', 'Import run', readonly=True)
+
+    @api.model
+    def queue(self, wizard_values, dryrun=False):
+        """ Queue an import of the ``ata_parser.bitrix_import`` wizard with
+        ``wizard_values`` and wake up the cron running the jobs.
+        """
+        job = self.sudo().create({
+            'name': 'Bitrix import (test)' if dryrun else 'Bitrix import',
+            'user_id': self.env.uid,
+            'dryrun': dryrun,
+            'wizard_values': json.dumps(wizard_values),
+        })
+        self.env.ref('ata_parser.ir_cron_bitrix_import_job')._trigger()
+        return job.sudo(False)
+
+    @api.model
+    def _cron_run_jobs(self):
+        for job in self.search([('state', '=', 'queued')], order='id'):
+            job._run()
+
+    def _run(self):
+        self.ensure_one()
+        self.write({'state': 'running', 'date_start': fields.Datetime.now()})
+        # visible to the progress cursor, and to the users polling the job
+        self.env.cr.commit()
+
+        progress = BitrixImportProgress(self)
+        run_id = False
+        try:
+            wizard_values = json.loads(self.wizard_values or '{}')
+            wizard = self.env['ata_parser.bitrix_import'].with_user(self.user_id).with_context(
+                lang=self.user_id.lang, tz=self.user_id.tz).create(wizard_values)
+            import_result = wizard.run_import(self.dryrun, progress)
+            is_ok = wizard.is_import_ok(import_result)
+            message = wizard.get_import_message(import_result)
+            run_id = wizard.run_id.id
+            self.env.cr.commit()
+        except Exception as e:
+            _logger.exception("Bitrix import job %s failed", self.id)
+            self.env.cr.rollback()
+            is_ok = False
+            message = str(e)
+
+        # the progress cursor updated the job meanwhile, it is written in a
+        # new transaction to not conflict with it
+        self.write(dict(
+            progress.get_values(),
+            state='done' if is_ok else 'failed',
+            date_end=fields.Datetime.now(),
+            message=message,
+            run_id=run_id,
+            wizard_values=False,
+        ))
+        self._notify(is_ok, message)
+        self.env.cr.commit()
+
+    def _notify(self, is_ok, message):
+        """ Deliver the notification the wizard shows after a synchronous import """
+        self.env['bus.bus']._sendone(self.user_id.partner_id, 'simple_notification', {
+            'title': self.name,
+            'message': message,
+            'sticky': True,
+            'type': 'success' if is_ok else 'danger',
+        })
@@ -0,0 +1,90 @@
+from psycopg2 import errors
+
+from odoo import api, fields, models
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import mute_logger
+from odoo.tools.translate import _
+
+from ..wizard.parser_bitrix_import import BITRIX_RULES, ParserBitrix
+
+
+class BitrixPortal(models.Model):
+    _name = 'ata_parser.bitrix_portal'
+    _description = 'Bitrix portal'
+    _order = 'sequence, id'
+
+    name = fields.Char('Name', required=True)
+    sequence = fields.Integer('Sequence', default=10)
+    active = fields.Boolean('Active', default=True)
+    url = fields.Char('URL', required=True, help="Employee list of the portal, e.g. https://example.bitrix24.ua/company/")
+    # credentials of the portal, only the managers see them
+    login = fields.Char('Login', groups='hr.group_hr_manager')
+    password = fields.Char('Password', groups='hr.group_hr_manager')
+    pages = fields.Integer('Maximum pages', default=13,
+                           help="Pages read at most when the directory has no pager")
+    workers = fields.Integer('Concurrent requests', default=4)
+    rule_ids = fields.One2many('ata_parser.bitrix_portal.rule', 'portal_id', 'Column mapping', copy=True,
+                               help="Employee field of each column of the portal, found by its title. "
+                                    "Without mapping, the columns of the default directory are expected.")
+
+    def get_parser(self):
+        """ Parser of the portal, with its credentials even if the user can't read them """
+        self.ensure_one()
+        portal = self.sudo()
+        return ParserBitrix(portal.url, portal.login or '', portal.password or '', portal.pages, portal.workers)
+
+    def get_rules(self):
+        self.ensure_one()
+        if not self.rule_ids:
+            return BITRIX_RULES
+        return [(rule.title, rule.field_name or '') for rule in self.rule_ids]
+
+    def map_rows(self, titles, rows):
+        """ Reorder the parsed ``rows`` as the columns of :meth:`get_rules`:
+        the columns are found by their title, the missing ones are empty.
+
+        :returns: (titles, rows)
+        """
+        self.ensure_one()
+        if not self.rule_ids:
+            return titles, rows
+        rule_titles = [title for title, _field in self.get_rules()]
+        indexes = [titles.index(title) if title in titles else None for title in rule_titles]
+        return rule_titles, [
+            tuple(row[index] if index is not None and index < len(row) else '' for index in indexes)
+            for row in rows
+        ]
+
+    def lock_for_import(self):
+        """ Lock the portals until the end of the transaction, so that two
+        imports of the same portal do not load it at the same time. The lock
+        is not waited for: a portal already being imported raises a
+        UserError.
+        """
+        if not self:
+            return
+        try:
+            with self.env.cr.savepoint(), mute_logger('odoo.sql_db'):
+                self.env.cr.execute('SELECT id FROM ata_parser_bitrix_portal WHERE id IN %s FOR UPDATE NOWAIT',
+                                    [tuple(self.ids)])
+        except errors.LockNotAvailable:
+            raise UserError(_("An import of %s is already running, try again once it is finished.",
+                              ', '.join(self.mapped('name'))))
+
+
+class BitrixPortalRule(models.Model):
+    _name = 'ata_parser.bitrix_portal.rule'
+    _description = 'Bitrix portal column mapping'
+    _order = 'portal_id, sequence, id'
+
+    portal_id = fields.Many2one('ata_parser.bitrix_portal', 'Portal', required=True, ondelete='cascade', index=True)
+    sequence = fields.Integer('Sequence', default=10)
+    title = fields.Char('Column title', required=True)
+    field_name = fields.Char('Employee field', help="Technical name of the hr.employee field, empty to skip the column")
+
+    @api.constrains('field_name')
+    def _check_field_name(self):
+        employee_fields = self.env['hr.employee']._fields
+        for rule in self:
+            if rule.field_name and rule.field_name.split('/')[0] not in employee_fields:
+                raise ValidationError(_("%s is not a field of the employees.", rule.field_name))
@@ -5,17 +5,25 @@ import unicodedata
 
 import datetime
 import io
+import itertools
 import logging
+import os
 import psycopg2
 import operator
 import re
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 from PIL import Image
 
 from odoo import api, fields, models
 from odoo.tools.translate import _
-from odoo.tools import config, DEFAULT_SERVER_DATE_FORMAT, DEFAULT_SERVER_DATETIME_FORMAT, pycompat
+from odoo.tools import config, str2bool, DEFAULT_SERVER_DATE_FORMAT, DEFAULT_SERVER_DATETIME_FORMAT, pycompat
+
+from .image_cache import ImageCache
+from .import_plan import IMAGE_FIELDS, ImportColumn, ImportField, ImportPlan
+from .import_profiler import NULL_PROFILER
 
 FIELDS_RECURSION_LIMIT = 3
 ERROR_PREVIEW_BYTES = 200
@@ -23,7 +31,20 @@ DEFAULT_IMAGE_TIMEOUT = 3
 DEFAULT_IMAGE_MAXBYTES = 10 * 1024 * 1024
 DEFAULT_IMAGE_REGEX = r"^(?:http|https)://"
 DEFAULT_IMAGE_CHUNK_SIZE = 32768
-IMAGE_FIELDS = ["icon", "image", "logo", "picture"]
+DEFAULT_IMAGE_WORKERS = 8
+FLOAT_REGEX = re.compile(r'([+-]?[0-9.,]+)')
+# removes the ascii digits and numeric decorations before looking for separators
+NON_SEPARATOR_TABLE = str.maketrans('', '', '0123456789()-+')
+DEFAULT_IMPORT_CHUNK_SIZE = 1000
+# required links filled by the create of the models inheriting these mixins,
+# they never need an imported value
+CREATE_FILLED_FIELDS = {
+    'resource.mixin': {'resource_id'},
+}
+# columns of a ``unique`` SQL constraint, see DataImport._validate_unique_constraints
+UNIQUE_CONSTRAINT_REGEX = re.compile(r'^\s*unique\s*\(([^)]*)\)\s*$', re.IGNORECASE)
+DEFAULT_IMAGE_CACHE_TTL = 3600
+DEFAULT_IMAGE_CACHE_MAXBYTES = 200 * 1024 * 1024
 
 _logger = logging.getLogger(__name__)
 
@@ -50,6 +71,16 @@ class ImportValidationError(Exception):
         self.field_type = kwargs.get('field_type')
 
 
+class ImageFileSizeError(Exception):
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.maxsize = maxsize
+
+
+class ImageResolutionError(Exception):
+    pass
+
+
 class DataImport(models.TransientModel):
     _name = 'ata_parser.data_import'
     _description = 'Import data from params to model'
@@ -83,86 +114,164 @@ class DataImport(models.TransientModel):
         # Get only list of actually imported fields
         import_fields = [f for f in data_fields if f]
 
+        # the only copy of the rows: the next stages convert them in place
         data = [list(row) for row in map(mapper, data_rows) if any(row)]
 
         # slicing needs to happen after filtering out empty rows as the
         # data offsets from load are post-filtering
-        return data[options.get('skip', 0):], import_fields
+        skip = options.get('skip', 0)
+        return data[skip:] if skip else data, import_fields
 
-    def _parse_import_data(self, data, import_fields, options):
-        """ Lauch first call to :meth:`_parse_import_data_recursive` with an
-        empty prefix. :meth:`_parse_import_data_recursive` will be run
-        recursively for each relational field.
+    def _compile_import_plan(self, import_fields, options):
+        """ Resolves every mapped column once for the whole import: the field
+        it targets, how its values are parsed, how duplicated mappings are
+        merged and which fallback value applies.
+
+        :param list(str) import_fields: mapped fields, as returned by :meth:`_map_import_data`
+        :rtype: ImportPlan
+        """
+        models_fields = {}
+
+        def get_fields(model):
+            if model not in models_fields:
+                models_fields[model] = self.env[model].fields_get(
+                    attributes=['type', 'relation', 'attachment', 'selection'])
+            return models_fields[model]
+
+        columns = []
+        parsed_fields = set()
+        for index, name in enumerate(import_fields):
+            # follow the relational fields of the path (e.g. parent_id/name)
+            model = self.res_model
+            path = name.split('/')
+            field = None
+            for depth, field_name in enumerate(path):
+                field = get_fields(model).get(field_name)
+                if field is None:
+                    break
+                if depth < len(path) - 1:
+                    if not field.get('relation'):
+                        field = None
+                        break
+                    model = field['relation']
+
+            parser = None
+            # only the first column mapped on a field is parsed, the others
+            # are dropped when merging anyway
+            if field and name not in parsed_fields:
+                if field['type'] in ('date', 'datetime'):
+                    parser = 'date'
+                elif field['type'] in ('float', 'monetary'):
+                    parser = 'float'
+                elif field['type'] == 'binary' and field.get('attachment') and any(f in name for f in IMAGE_FIELDS):
+                    parser = 'image'
+                if parser:
+                    parsed_fields.add(name)
+            columns.append(ImportColumn(index, name, model, field, parser))
+
+        # Get fields and their occurrences indexes
+        mapped_field_indexes = {}
+        for column in columns:
+            mapped_field_indexes.setdefault(column.name, []).append(column)
+
+        fallback_values = options.get('fallback_values') or {}
+        plan_fields = []
+        for name, field_columns in mapped_field_indexes.items():
+            fallback = fallback_values.get(name)
+            if fallback:
+                fallback = dict(fallback)
+                if fallback['field_type'] == 'selection':
+                    target_field = name.split('/')[-1]
+                    selection = self.env[fallback['field_model']].fields_get([target_field])[target_field]['selection']
+                    fallback['selection_values'] = frozenset(value.lower() for (key, value) in selection)
+            plan_fields.append(ImportField(
+                name, field_columns[0].field_type, [column.index for column in field_columns], fallback))
+
+        return ImportPlan(columns, plan_fields)
+
+    def _parse_import_data(self, data, import_fields, options, plan=None):
+        """ Parses the date, float and image columns of the import, as
+        described by the import ``plan``.
         """
-        return self._parse_import_data_recursive(self.res_model, '', data, import_fields, options)
-
-    def _parse_import_data_recursive(self, model, prefix, data, import_fields, options):
-        # Get fields of type date/datetime
-        all_fields = self.env[model].fields_get()
-        for name, field in all_fields.items():
-            name = prefix + name
-            # Check if the field is in import_field and is a relational (followed by /)
-            # Also verify that the field name exactly match the import_field at the correct level.
-            if any(name + '/' in import_field and name == import_field.split('/')[prefix.count('/')] for import_field in import_fields):
-                # Recursive call with the relational as new model and add the field name to the prefix
-                self._parse_import_data_recursive(field['relation'], name + '/', data, import_fields, options)
-            elif field['type'] in ('date', 'datetime') and name in import_fields:
+        plan = plan or self._compile_import_plan(import_fields, options)
+        for column in plan.columns:
+            if column.parser == 'date':
                 # Parse date, datetime values from input data
-                index = import_fields.index(name)
-                self._parse_date_from_data(data, index, name, field['type'], options)
-            elif field['type'] in ('float', 'monetary') and name in import_fields:
+                self._parse_date_from_data(data, column.index, column.name, column.field_type, options)
+            elif column.parser == 'float':
                 # Parse float, monetary from input data
                 # Sometimes float values have currency symbol or () to denote a negative value
                 # We should be able to manage both case
-                index = import_fields.index(name)
-                self._parse_float_from_data(data, index, name, options)
-            elif field['type'] == 'binary' and field.get('attachment') and any(f in name for f in IMAGE_FIELDS) and name in import_fields:
-                index = import_fields.index(name)
-
-                with requests.Session() as session:
-                    session.stream = True
-
-                    for num, line in enumerate(data):
-                        if re.match(config.get("import_image_regex", DEFAULT_IMAGE_REGEX), line[index]):
-                            if not self.env.user._can_import_remote_urls():
-                                raise ImportValidationError(
-                                    _("You can not import images via URL, check with your administrator or support for the reason."),
-                                    field=name, field_type=field['type']
-                                )
-
-                            line[index] = self._import_image_by_url(line[index], session, name, num)
-                        else:
-                            try:
-                                base64.b64decode(line[index], validate=True)
-                            except binascii.Error:
-                                raise ImportValidationError(
-                                    _("Found invalid image data, images should be imported as either URLs or base64-encoded data."),
-                                    field=name, field_type=field['type']
-                                )
+                self._parse_float_from_data(data, column.index, column.name, options)
+            elif column.parser == 'image':
+                self._parse_image_from_data(data, column.index, column.name, column.field_type,
+                                            download=not options.get('validate_only'))
 
         return data
 
+    def _parse_image_from_data(self, data, index, name, field_type, download=True):
+        """ Replaces the image URLs of a column by the downloaded images, the
+        other values must be base64 data. Without ``download``, the values
+        are only checked: the URLs are left as is.
+        """
+        with requests.Session() as session:
+            session.stream = True
+
+            regex = config.get("import_image_regex", DEFAULT_IMAGE_REGEX)
+            urls = {num: line[index] for num, line in enumerate(data) if re.match(regex, line[index])}
+            if urls and not self.env.user._can_import_remote_urls():
+                raise ImportValidationError(
+                    _("You can not import images via URL, check with your administrator or support for the reason."),
+                    field=name, field_type=field_type
+                )
+            images = self._import_images_by_url(urls, session, name) if download else {}
+
+            for num, line in enumerate(data):
+                if num in urls:
+                    if not download:
+                        continue
+                    image = images[line[index]]
+                    if isinstance(image, Exception):
+                        raise self._get_image_url_error(line[index], name, num, image)
+                    line[index] = image
+                else:
+                    try:
+                        base64.b64decode(line[index], validate=True)
+                    except binascii.Error:
+                        raise ImportValidationError(
+                            _("Found invalid image data, images should be imported as either URLs or base64-encoded data."),
+                            field=name, field_type=field_type
+                        )
+
     def _parse_date_from_data(self, data, index, name, field_type, options):
+        """ Parses a date/datetime column: each distinct value is parsed once
+        and the result reused for the other rows holding it.
+        """
         dt = datetime.datetime
         fmt = fields.Date.to_string if field_type == 'date' else fields.Datetime.to_string
         d_fmt = options.get('date_format')
         dt_fmt = options.get('datetime_format')
+        parsed_values = {}
         for num, line in enumerate(data):
             if not line[index]:
                 continue
 
             v = line[index].strip()
+            parsed = parsed_values.get(v)
+            if parsed is not None:
+                line[index] = parsed
+                continue
             try:
                 # first try parsing as a datetime if it's one
                 if dt_fmt and field_type == 'datetime':
                     try:
-                        line[index] = fmt(dt.strptime(v, dt_fmt))
+                        line[index] = parsed_values[v] = fmt(dt.strptime(v, dt_fmt))
                         continue
                     except ValueError:
                         pass
                 # otherwise try parsing as a date whether it's a date
                 # or datetime
-                line[index] = fmt(dt.strptime(v, d_fmt))
+                line[index] = parsed_values[v] = fmt(dt.strptime(v, d_fmt))
             except ValueError as e:
                 raise ImportValidationError(
                     _("Column %s contains incorrect values. Error in line %d: %s") % (name, num + 1, e),
@@ -176,26 +285,37 @@ class DataImport(models.TransientModel):
 
     @api.model
     def _parse_float_from_data(self, data, index, name, options):
+        """ Parses a float/monetary column: each distinct value is parsed once
+        and the result reused for the other rows holding it.
+        """
+        parsed_values = {}
         for line in data:
-            line[index] = line[index].strip()
-            if not line[index]:
+            value = line[index] = line[index].strip()
+            if not value:
                 continue
-            thousand_separator, decimal_separator = self._infer_separators(line[index], options)
+            parsed = parsed_values.get(value)
+            if parsed is None:
+                parsed = parsed_values[value] = self._parse_float_value(value, name, options)
+            line[index] = parsed
 
-            if 'E' in line[index] or 'e' in line[index]:
-                tmp_value = line[index].replace(thousand_separator, '.')
-                try:
-                    tmp_value = '{:f}'.format(float(tmp_value))
-                    line[index] = tmp_value
-                    thousand_separator = ' '
-                except Exception:
-                    pass
+    def _parse_float_value(self, value, name, options):
+        thousand_separator, decimal_separator = self._infer_separators(value, options)
 
-            line[index] = line[index].replace(thousand_separator, '').replace(decimal_separator, '.')
-            old_value = line[index]
-            line[index] = self._remove_currency_symbol(line[index])
-            if line[index] is False:
-                raise ImportValidationError(_("Column %s contains incorrect values (value: %s)", name, old_value), field=name)
+        if 'E' in value or 'e' in value:
+            tmp_value = value.replace(thousand_separator, '.')
+            try:
+                tmp_value = '{:f}'.format(float(tmp_value))
+                value = tmp_value
+                thousand_separator = ' '
+            except Exception:
+                pass
+
+        value = value.replace(thousand_separator, '').replace(decimal_separator, '.')
+        old_value = value
+        value = self._remove_currency_symbol(value)
+        if value is False:
+            raise ImportValidationError(_("Column %s contains incorrect values (value: %s)", name, old_value), field=name)
+        return value
 
     def _infer_separators(self, value, options):
         """ Try to infer the shape of the separators: if there are two
@@ -206,8 +326,8 @@ class DataImport(models.TransientModel):
         """
         # can't use \p{Sc} using re so handroll it
         non_number = [
-            # any character
-            c for c in value
+            # any character (but the ascii digits, the bulk of the value)
+            c for c in value.translate(NON_SEPARATOR_TABLE)
             # which is not a numeric decoration (() is used for negative
             # by accountants)
             if c not in '()-+'
@@ -234,7 +354,7 @@ class DataImport(models.TransientModel):
         if value.startswith('(') and value.endswith(')'):
             value = value[1:-1]
             negative = True
-        float_regex = re.compile(r'([+-]?[0-9.,]+)')
+        float_regex = FLOAT_REGEX
         split_value = [g for g in float_regex.split(value) if g]
         if len(split_value) > 2:
             # This is probably not a float
@@ -249,8 +369,8 @@ class DataImport(models.TransientModel):
             if float_regex.search(split_value[0]) is not None:
                 currency_index = 1
             # Check that currency exists
-            currency = self.env['res.currency'].search([('symbol', '=', split_value[currency_index].strip())])
-            if len(currency):
+            symbols = self.env['res.currency']._get_import_symbols()
+            if split_value[currency_index].strip() in symbols:
                 return split_value[(currency_index + 1) % 2] if not negative else '-' + split_value[(currency_index + 1) % 2]
             # Otherwise it is not a float with a currency symbol
             return False
@@ -266,46 +386,150 @@ class DataImport(models.TransientModel):
         :rtype: bytes
         """
         maxsize = int(config.get("import_image_maxbytes", DEFAULT_IMAGE_MAXBYTES))
+        timeout = int(config.get("import_image_timeout", DEFAULT_IMAGE_TIMEOUT))
+        cache = self._get_image_cache()
         _logger.debug("Trying to import image from URL: %s into field %s, at line %s" % (url, field, line_number))
         try:
-            response = session.get(url, timeout=int(config.get("import_image_timeout", DEFAULT_IMAGE_TIMEOUT)))
-            response.raise_for_status()
+            return self._download_image(url, session, maxsize, timeout, cache)
+        except Exception as e:
+            _logger.exception(e)
+            raise self._get_image_url_error(url, field, line_number, e)
+        finally:
+            if cache:
+                cache.save()
 
-            if response.headers.get('Content-Length') and int(response.headers['Content-Length']) > maxsize:
-                raise ImportValidationError(
-                    _("File size exceeds configured maximum (%s bytes)", maxsize),
-                    field=field
-                )
+    def _import_images_by_url(self, urls, session, field):
+        """ Imports the images of a whole column with a bounded pool of
+        workers, each distinct URL being downloaded only once.
 
-            content = bytearray()
-            for chunk in response.iter_content(DEFAULT_IMAGE_CHUNK_SIZE):
-                content += chunk
-                if len(content) > maxsize:
-                    raise ImportValidationError(
-                        _("File size exceeds configured maximum (%s bytes)", maxsize),
-                        field=field
-                    )
-
-            image = Image.open(io.BytesIO(content))
-            w, h = image.size
-            if w * h > 42e6:  # Nokia Lumia 1020 photo resolution
-                raise ImportValidationError(
-                    _("Image size excessive, imported images must be smaller than 42 million pixel"),
-                    field=field
-                )
+        :param dict urls: {0-indexed line number: url}
+        :param requests.Session session:
+        :param str field: name of the field (for logging/debugging)
+        :return: {url: base64 content, or the exception raised by the download}
+        :rtype: dict
+        """
+        distinct_urls = list(dict.fromkeys(urls.values()))
+        if not distinct_urls:
+            return {}
 
-            return base64.b64encode(content)
-        except Exception as e:
-            _logger.exception(e)
-            raise ImportValidationError(
-                _(
-                    "Could not retrieve URL: %(url)s [%(field_name)s: L%(line_number)d]: %(error)s",
-                    url=url, field_name=field, line_number=line_number + 1, error=e
-                ),
-                field=field
-            )
-
-    def _handle_multi_mapping(self, data, import_fields):
+        maxsize = int(config.get("import_image_maxbytes", DEFAULT_IMAGE_MAXBYTES))
+        timeout = int(config.get("import_image_timeout", DEFAULT_IMAGE_TIMEOUT))
+        workers = min(max(1, int(config.get("import_image_workers", DEFAULT_IMAGE_WORKERS))), len(distinct_urls))
+        cache = self._get_image_cache()
+        adapter = HTTPAdapter(pool_maxsize=workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        def download(url):
+            # runs in a worker thread: no access to the environment here
+            _logger.debug("Trying to import image from URL: %s into field %s" % (url, field))
+            try:
+                return self._download_image(url, session, maxsize, timeout, cache)
+            except Exception as e:
+                _logger.exception(e)
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            images = dict(zip(distinct_urls, executor.map(download, distinct_urls)))
+        if cache:
+            cache.save()
+        return images
+
+    @api.model
+    def _get_image_cache(self):
+        """ The on-disk cache of imported images of the database, None if
+        disabled with ``import_image_cache = False`` in the server
+        configuration. It is kept in the filestore of the database, or in a
+        directory of the database under ``import_image_cache_dir``.
+        """
+        if not str2bool(str(config.get("import_image_cache", True))):
+            return None
+        dbname = self.env.cr.dbname
+        if config.get("import_image_cache_dir"):
+            path = os.path.join(config["import_image_cache_dir"], dbname)
+        else:
+            path = os.path.join(config.filestore(dbname), 'ata_parser_image_cache')
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            _logger.warning("Image cache directory %s is not writable, images are not cached", path)
+            return None
+        return ImageCache(
+            path,
+            ttl=int(config.get("import_image_cache_ttl", DEFAULT_IMAGE_CACHE_TTL)),
+            maxbytes=int(config.get("import_image_cache_maxbytes", DEFAULT_IMAGE_CACHE_MAXBYTES)),
+        )
+
+    @staticmethod
+    def _download_image(url, session, maxsize, timeout, cache=None):
+        """ Downloads an image and checks its size and resolution
+
+        With a ``cache``, an image cached within its TTL is not requested at
+        all and an expired one is revalidated with a conditional request; in
+        both cases the dimensions recorded in the cache are checked instead of
+        decoding the image again.
+
+        :raises ImageFileSizeError: if the file is bigger than ``maxsize`` bytes
+        :raises ImageResolutionError: if the image has more than 42 million pixels
+        :return: the base64 encoded content
+        :rtype: bytes
+        """
+        entry = cache.get(url) if cache else None
+        response = None
+        if entry and not cache.is_fresh(entry):
+            response = session.get(url, timeout=timeout, headers=cache.get_validators(entry))
+            if response.status_code == 304:
+                response.close()
+                response = None
+                cache.revalidate(url)
+
+        if entry and response is None:
+            content = cache.read(url, entry)
+            if content is not None:
+                if len(content) > maxsize:
+                    raise ImageFileSizeError(maxsize)
+                if entry['width'] * entry['height'] > 42e6:
+                    raise ImageResolutionError()
+                return base64.b64encode(content)
+            # the cached file is gone, download it again
+            response = session.get(url, timeout=timeout)
+        elif response is None:
+            response = session.get(url, timeout=timeout)
+
+        response.raise_for_status()
+
+        if response.headers.get('Content-Length') and int(response.headers['Content-Length']) > maxsize:
+            raise ImageFileSizeError(maxsize)
+
+        content = bytearray()
+        for chunk in response.iter_content(DEFAULT_IMAGE_CHUNK_SIZE):
+            content += chunk
+            if len(content) > maxsize:
+                raise ImageFileSizeError(maxsize)
+
+        image = Image.open(io.BytesIO(content))
+        w, h = image.size
+        if cache:
+            cache.store(url, content, response.headers, (w, h))
+        if w * h > 42e6:  # Nokia Lumia 1020 photo resolution
+            raise ImageResolutionError()
+
+        return base64.b64encode(content)
+
+    def _get_image_url_error(self, url, field, line_number, error):
+        if isinstance(error, ImageFileSizeError):
+            error = _("File size exceeds configured maximum (%s bytes)", error.maxsize)
+        elif isinstance(error, ImageResolutionError):
+            error = _("Image size excessive, imported images must be smaller than 42 million pixel")
+        return ImportValidationError(
+            _(
+                "Could not retrieve URL: %(url)s [%(field_name)s: L%(line_number)d]: %(error)s",
+                url=url, field_name=field, line_number=line_number + 1, error=error
+            ),
+            field=field
+        )
+
+    def _handle_multi_mapping(self, data, import_fields, plan=None):
         """ This method handles multiple mapping on the same field.
 
         It will return the list of the mapped fields and the concatenated data for each field:
@@ -338,46 +562,30 @@ class DataImport(models.TransientModel):
         fields
             ``[desc, some_number, partner]``
         """
-        # Get fields and their occurrences indexes
-        # Among the fields that have been mapped, we get their corresponding mapped column indexes
-        # as multiple fields could have been mapped to multiple columns.
-        mapped_field_indexes = {}
-        for idx, field in enumerate(field for field in import_fields if field):
-            mapped_field_indexes.setdefault(field, list()).append(idx)
-        import_fields = list(mapped_field_indexes.keys())
+        plan = plan or self._compile_import_plan(import_fields, {})
 
-        # recreate data and merge duplicates (applies only on text or char fields)
+        # every field is mapped once: the rows are already the ones to load
+        if not plan.has_multi_mapping:
+            return data, list(plan.import_fields)
+
+        # recreate data and merge duplicates (applies only on text, char and many2many fields)
         # Also handles multi-mapping on "field of relation fields".
+        merge_rules = [(field.indexes, field.separator) for field in plan.fields]
         merged_data = []
         for record in data:
             new_record = []
-            for mapped_fields, indexes in mapped_field_indexes.items():
-                split_fields = mapped_fields.split('/')
-                target_field = split_fields[-1]
-
-                # get target_field type (on target model)
-                target_model = self.res_model
-                for field in split_fields:
-                    if field != target_field:  # if not on the last hierarchy level, retarget the model
-                        target_model = self.env[target_model][field]._name
-                field = self.env[target_model]._fields.get(target_field)
-                field_type = field.type if field else ''
-
+            for indexes, separator in merge_rules:
                 # merge data if necessary
-                if field_type == 'char':
-                    new_record.append(' '.join(record[idx] for idx in indexes if record[idx]))
-                elif field_type == 'text':
-                    new_record.append('\n'.join(record[idx] for idx in indexes if record[idx]))
-                elif field_type == 'many2many':
-                    new_record.append(','.join(record[idx] for idx in indexes if record[idx]))
+                if separator is not None:
+                    new_record.append(separator.join(record[idx] for idx in indexes if record[idx]))
                 else:
                     new_record.append(record[indexes[0]])
 
             merged_data.append(new_record)
 
-        return merged_data, import_fields
+        return merged_data, list(plan.import_fields)
 
-    def _handle_fallback_values(self, import_field, input_file_data, fallback_values):
+    def _handle_fallback_values(self, import_field, input_file_data, fallback_values, plan=None):
         """
         If there are fallback values, this method will replace the input file
         data value if it does not match the possible values for the given field.
@@ -416,32 +624,13 @@ class DataImport(models.TransientModel):
                     }
                 }
         """
-        # add possible selection values into our fallback dictionary for fields of type "selection"
-        for field_string in fallback_values:
-            if fallback_values[field_string]['field_type'] != "selection":
-                continue
-            field_path = field_string.split('/')
-            target_field = field_path[-1]
-            target_model = self.env[fallback_values[field_string]['field_model']]
-
-            selection_values = [value.lower() for (key, value) in target_model.fields_get([target_field])[target_field]['selection']]
-            fallback_values[field_string]['selection_values'] = selection_values
-
-        # check fallback values
-        for record_index, records in enumerate(input_file_data):
-            for column_index, value in enumerate(records):
-                field = import_field[column_index]
+        plan = plan or self._compile_import_plan(import_field, {'fallback_values': fallback_values})
 
-                if field in fallback_values:
-                    fallback_value = fallback_values[field]['fallback_value']
-                    # Boolean
-                    if fallback_values[field]['field_type'] == "boolean":
-                        value = value if value.lower() in ('0', '1', 'true', 'false') else fallback_value
-                    # Selection
-                    elif value.lower() not in fallback_values[field]["selection_values"]:
-                        value = fallback_value if fallback_value != 'skip' else None  # don't set any value if we skip
-
-                    input_file_data[record_index][column_index] = value
+        # check fallback values, only the columns having one are looked at
+        for column_index, field in plan.fallback_fields:
+            resolve = field.get_fallback_resolver()
+            for record in input_file_data:
+                record[column_index] = resolve(record[column_index])
 
         return input_file_data
 
@@ -449,68 +638,562 @@ class DataImport(models.TransientModel):
 
         self.ensure_one()
 
+        if options.get('chunk_size') or options.get('continue_on_error'):
+            return self._execute_import_chunks(input_data, import_fields, options, dryrun)
+
         if not input_data:
             return {'messages': ['No input data!']}
 
-        self._cr.execute('SAVEPOINT import')
-
         # Delete non-importable columns
         input_data, import_fields = self._map_import_data(input_data, import_fields, options)
 
-        # Parse date and float field
-        input_data = self._parse_import_data(input_data, import_fields, options)
+        import_result, import_fields = self._load_data(input_data, import_fields, options, dryrun)
+        if import_result['ids'] and options.get('progress_callback'):
+            options['progress_callback'](loaded=len(import_result['ids']))
 
-        _logger.info('importing %d rows...', len(input_data))
+        import_limit = options.get('limit')
+        if 'name' in import_fields:
+            index_of_name = import_fields.index('name')
+            skipped = options.get('skip', 0)
+            # pad front as data doesn't contain anythig for skipped lines
+            r = import_result['name'] = [''] * skipped
+            # only add names for the window being imported
+            r.extend(x[index_of_name] for x in input_data[:import_limit])
+            # pad back (though that's probably not useful)
+            r.extend([''] * (len(input_data) - (import_limit or 0)))
+        else:
+            import_result['name'] = []
 
-        merged_data, import_fields = self._handle_multi_mapping(input_data, import_fields)
+        skip = options.get('skip', 0)
+        # convert load's internal nextrow to the imported file's
+        if import_result['nextrow']: # don't update if nextrow = 0 (= no nextrow)
+            import_result['nextrow'] += skip
+
+        return import_result
 
-        if options.get('fallback_values'):
-            merged_data = self._handle_fallback_values(import_fields, merged_data, options['fallback_values'])
+    def _load_data(self, input_data, import_fields, options, dryrun=False, plan=None):
+        """ Parse the mapped ``input_data`` and load it into the model under
+        its own savepoint, following the import ``plan`` (compiled from
+        ``import_fields`` if not given).
 
-        name_create_enabled_fields = options.pop('name_create_enabled_fields', {})
-        import_limit = options.pop('limit', None)
-        model = self.env[self.res_model].with_context(
-            import_file=False,
-            name_create_enabled_fields=name_create_enabled_fields,
-            import_set_empty_fields=options.get('import_set_empty_fields', []),
-            import_skip_records=options.get('import_skip_records', []),
-            _import_limit=import_limit)
-        import_result = model.load(import_fields, merged_data)
+        :returns: (import_result, import_fields) where ``import_fields`` are the
+                  fields actually sent to ``load`` (after multi-mapping)
+        """
+        plan = plan or self._compile_import_plan(import_fields, options)
+        profiler = options.get('profiler') or NULL_PROFILER
+
+        # Parse date and float field (this does not write anything, a
+        # validation error leaves no savepoint behind)
+        with profiler.stage('parse_data') as stage:
+            input_data = self._parse_import_data(input_data, import_fields, options, plan)
+            stage.add(rows=len(input_data))
+
+        # pending writes must not be lost when rolling back to the savepoint
+        self.env['base'].flush()
+        self._cr.execute('SAVEPOINT import')
+
+        _logger.info('importing %d rows...', len(input_data))
+
+        merged_data, import_fields = self._prepare_load_data(input_data, import_fields, options, plan)
+
+        model = self._get_load_model(options)
+        with profiler.stage('load') as stage:
+            import_result = model.load(import_fields, merged_data)
+            stage.add(rows=len(import_result['ids'] or []))
         _logger.info('done')
 
         # If transaction aborted, RELEASE SAVEPOINT is going to raise
         # an InternalError (ROLLBACK should work, maybe). Ignore that.
-        # TODO: to handle multiple errors, create savepoint around
-        #       write and release it in case of write error (after
-        #       adding error to errors array) => can keep on trying to
-        #       import stuff, and rollback at the end if there is any
-        #       error in the results.
+        # To keep on importing after errors, see the ``continue_on_error``
+        # option of :meth:`_execute_import_chunks`.
         try:
-            if dryrun:
+            if dryrun or not import_result['ids']:
+                # load only rolls back its own changes when it fails: the
+                # records created by _resolve_relational_names go as well
+                self.env['base'].flush()
                 self._cr.execute('ROLLBACK TO SAVEPOINT import')
+                self.env['base'].invalidate_cache()
+            else:
+                self._cr.execute('RELEASE SAVEPOINT import')
+            if dryrun:
                 # cancel all changes done to the registry/ormcache
                 self.pool.clear_caches()
                 self.pool.reset_changes()
-            else:
-                self._cr.execute('RELEASE SAVEPOINT import')
         except psycopg2.InternalError:
             pass
 
+        return import_result, import_fields
+
+    def _prepare_load_data(self, data, import_fields, options, plan):
+        """ Merge the parsed ``data`` into the rows given to ``load``: the
+        multi-mapped columns are merged, the fallback values applied and the
+        relational names resolved (creating the missing records allowed by
+        ``name_create_enabled_fields``).
+
+        :returns: (data, import_fields)
+        """
+        profiler = options.get('profiler') or NULL_PROFILER
+        with profiler.stage('multi_mapping') as stage:
+            merged_data, import_fields = self._handle_multi_mapping(data, import_fields, plan)
+            stage.add(rows=len(merged_data))
+
+        if plan.fallback_fields:
+            with profiler.stage('fallback_values') as stage:
+                merged_data = self._handle_fallback_values(import_fields, merged_data, options['fallback_values'], plan)
+                stage.add(rows=len(merged_data))
+
+        with profiler.stage('resolve_names') as stage:
+            import_fields = self._resolve_relational_names(merged_data, import_fields, options)
+            stage.add(rows=len(merged_data))
+        return merged_data, import_fields
+
+    def _get_load_model(self, options):
+        return self.env[self.res_model].with_context(
+            import_file=False,
+            name_create_enabled_fields=options.get('name_create_enabled_fields', {}),
+            import_set_empty_fields=options.get('import_set_empty_fields', []),
+            import_skip_records=options.get('import_skip_records', []),
+            _import_limit=options.get('limit'))
+
+    def convert_import(self, input_data, import_fields, options):
+        """ Values of the records the import of ``input_data`` would load,
+        converted as ``load`` does it but not written, to create or update
+        them in bulk (see ``BitrixImport.upsert_records``). The records of the
+        relational names allowed by ``name_create_enabled_fields`` are created.
+
+        The database ids of a ``.id`` column are not checked one row at a
+        time as ``load`` does: they are given as the ``id`` of the values.
+
+        :returns: (vals_list, messages), the messages in the format of ``load``
+        :raises ImportValidationError: when the values can not be parsed
+        """
+        self.ensure_one()
+        data, import_fields = self._map_import_data(input_data, import_fields, options)
+        plan = self._compile_import_plan(import_fields, options)
+        profiler = options.get('profiler') or NULL_PROFILER
+        with profiler.stage('parse_data') as stage:
+            data = self._parse_import_data(data, import_fields, options, plan)
+            stage.add(rows=len(data))
+        data, import_fields = self._prepare_load_data(data, import_fields, options, plan)
+
+        ids = [False] * len(data)
+        if '.id' in import_fields:
+            id_index = import_fields.index('.id')
+            ids = [int(row[id_index]) if row[id_index] else False for row in data]
+            import_fields = import_fields[:id_index] + import_fields[id_index + 1:]
+            data = [row[:id_index] + row[id_index + 1:] for row in data]
+
+        model = self._get_load_model(options)
+        messages = []
+        vals_list = []
+        with profiler.stage('convert') as stage:
+            fields_ = [models.fix_import_export_id_paths(name) for name in import_fields]
+            extracted = model._extract_records(fields_, data, log=messages.append)
+            for dbid, xid, vals, info in model._convert_records(extracted, log=messages.append):
+                if ids[info['record']]:
+                    vals['id'] = ids[info['record']]
+                vals_list.append(vals)
+            stage.add(rows=len(vals_list))
+        return vals_list, messages
+
+    @api.model
+    def _iter_chunks(self, rows, size):
+        if not size:
+            # a single chunk of all the rows
+            rows = list(rows)
+            if rows:
+                yield rows
+            return
+        rows = iter(rows)
+        chunk = list(itertools.islice(rows, size))
+        while chunk:
+            yield chunk
+            chunk = list(itertools.islice(rows, size))
+
+    def _execute_import_chunks(self, input_data, import_fields, options, dryrun=False):
+        """ Load ``input_data``, which can be any iterable of rows (e.g. a
+        generator fed by the parser), in chunks of ``options['chunk_size']``
+        rows, each chunk under its own savepoint. Only one chunk is held in
+        memory at a time. A ``chunk_size`` of 0 loads all the rows in one
+        chunk, without the option the chunks have ``DEFAULT_IMPORT_CHUNK_SIZE``
+        rows.
+
+        By default loading stops at the first chunk that fails: the chunks
+        before it stay imported and ``nextrow`` points at the first row of the
+        failed chunk. With ``options['continue_on_error']``, a failed chunk is
+        split in halves which are loaded again, down to the offending rows, so
+        every valid row is imported and the errors of all the invalid ones are
+        reported.
+
+        The ``limit`` option is not supported in this mode.
+        """
+        chunk_options = dict(options, skip=0, limit=None)
+        chunk_size = options['chunk_size'] if options.get('chunk_size') is not None else DEFAULT_IMPORT_CHUNK_SIZE
+        to_skip = options.get('skip', 0)
+        import_result = {'ids': [], 'messages': [], 'nextrow': 0, 'name': []}
+        offset = 0
+        has_data = False
+        plan = None
+
+        for chunk in self._iter_chunks(input_data, chunk_size):
+            data, chunk_fields = self._map_import_data(chunk, import_fields, chunk_options)
+            # skip counts non-empty rows of the whole input, not of the chunk
+            skipped = min(to_skip, len(data))
+            to_skip -= skipped
+            data = data[skipped:]
+            if not data:
+                continue
+            has_data = True
+            # the mapping is the same for every chunk
+            plan = plan or self._compile_import_plan(chunk_fields, chunk_options)
+
+            if not self._load_chunk(data, chunk_fields, chunk_options, dryrun, plan, offset, import_result) \
+                    and not options.get('continue_on_error'):
+                import_result['nextrow'] = offset + options.get('skip', 0)
+                break
+            offset += len(data)
+
+        if not has_data:
+            return {'messages': ['No input data!']}
+
+        return import_result
+
+    def _load_chunk(self, data, import_fields, options, dryrun, plan, offset, import_result):
+        """ Load a chunk of mapped rows starting at row ``offset`` of the
+        import, and add its ids, names and messages to ``import_result``.
+        With ``options['continue_on_error']``, a failed chunk is bisected.
+
+        :returns: whether all the rows of the chunk were imported
+        :rtype: bool
+        """
+        bisect = options.get('continue_on_error') and len(data) > 1
+        # parsing converts the rows in place, keep them to load them again
+        rows = [list(row) for row in data] if bisect else data
+        try:
+            chunk_result, load_fields = self._load_data(data, import_fields, options, dryrun, plan)
+        except ImportValidationError as error:
+            chunk_result = {'ids': False, 'messages': [{
+                'type': error.type,
+                'message': error.message,
+                'record': False,
+                'field': error.field_path[0] if error.field_path else False,
+                'rows': {'from': 0, 'to': len(data) - 1},
+            }]}
+            load_fields = plan.import_fields
+
+        if not chunk_result['ids'] and bisect:
+            half = len(rows) // 2
+            first = self._load_chunk(rows[:half], import_fields, options, dryrun, plan, offset, import_result)
+            second = self._load_chunk(rows[half:], import_fields, options, dryrun, plan, offset + half, import_result)
+            return first and second
+
+        # load reports rows relative to the chunk
+        for message in chunk_result['messages']:
+            if message.get('rows'):
+                message['rows'] = {'from': message['rows']['from'] + offset,
+                                   'to': message['rows']['to'] + offset}
+            if isinstance(message.get('record'), int) and not isinstance(message.get('record'), bool):
+                message['record'] += offset
+            import_result['messages'].append(message)
+
+        if not chunk_result['ids']:
+            return False
+
+        import_result['ids'].extend(chunk_result['ids'])
+        if options.get('progress_callback'):
+            options['progress_callback'](loaded=len(chunk_result['ids']))
+        if 'name' in load_fields:
+            index_of_name = load_fields.index('name')
+            import_result['name'].extend(x[index_of_name] for x in data)
+        return True
+
+    def validate_import(self, input_data, input_columns, import_fields, options):
+        """ Check the import as :meth:`execute_import` would do it, without
+        loading it: nothing is written, so there is no savepoint to roll back
+        and the registry caches are left alone.
+
+        The values are parsed, then checked in bulk against the model: the
+        required fields, the selection values, the existing records of the
+        relational names, the database ids and the ``unique`` SQL constraints
+        on imported text columns. The image URLs are checked but not
+        downloaded. The other constraints, only enforced when writing (python
+        constraints, other SQL constraints), are not checked.
+
+        :returns: the result shape of :meth:`execute_import`, without ids
+        """
+        self.ensure_one()
+        import_result = {'ids': False, 'messages': [], 'nextrow': 0, 'name': []}
+        data, import_fields = self._map_import_data(input_data, import_fields, options)
+        if not data:
+            import_result['messages'].append('No input data!')
+            return import_result
+
+        options = dict(options, validate_only=True)
+        plan = self._compile_import_plan(import_fields, options)
+        profiler = options.get('profiler') or NULL_PROFILER
+        try:
+            with profiler.stage('parse_data') as stage:
+                data = self._parse_import_data(data, import_fields, options, plan)
+                stage.add(rows=len(data))
+        except ImportValidationError as error:
+            import_result['messages'].append({
+                'type': error.type,
+                'message': error.message,
+                'record': False,
+                'field': error.field_path[0] if error.field_path else False,
+                'rows': {'from': 0, 'to': len(data) - 1},
+            })
+            return import_result
+
+        data, import_fields = self._handle_multi_mapping(data, import_fields, plan)
+        if plan.fallback_fields:
+            data = self._handle_fallback_values(import_fields, data, options.get('fallback_values'), plan)
+
+        with profiler.stage('validate') as stage:
+            import_result['messages'] = self._validate_data(data, import_fields, options)
+            stage.add(rows=len(data))
         if 'name' in import_fields:
             index_of_name = import_fields.index('name')
-            skipped = options.get('skip', 0)
-            # pad front as data doesn't contain anythig for skipped lines
-            r = import_result['name'] = [''] * skipped
-            # only add names for the window being imported
-            r.extend(x[index_of_name] for x in input_data[:import_limit])
-            # pad back (though that's probably not useful)
-            r.extend([''] * (len(input_data) - (import_limit or 0)))
-        else:
-            import_result['name'] = []
+            import_result['name'] = [row[index_of_name] for row in data]
+        return import_result
 
-        skip = options.get('skip', 0)
-        # convert load's internal nextrow to the imported file's
-        if import_result['nextrow']: # don't update if nextrow = 0 (= no nextrow)
-            import_result['nextrow'] += skip
+    def _validate_data(self, data, import_fields, options):
+        """ Messages, in the format of ``load``, of the rows of ``data`` the
+        model would reject.
+        """
+        model = self.env[self.res_model]
+        messages = []
+
+        def error(message, field, num=None):
+            rows = {'from': num, 'to': num} if num is not None else {'from': 0, 'to': len(data) - 1}
+            messages.append({
+                'type': 'error',
+                'message': message,
+                'field': field,
+                'record': num if num is not None else False,
+                'rows': rows,
+            })
+
+        # rows with a database id update a record, the others create one
+        id_index = import_fields.index('.id') if '.id' in import_fields else None
+        if id_index is not None:
+            ids = {}
+            for num, row in enumerate(data):
+                if row[id_index]:
+                    try:
+                        ids.setdefault(int(row[id_index]), num)
+                    except ValueError:
+                        error(_("Invalid database id '%s'", row[id_index]), '.id', num)
+            for missing in set(ids) - set(model.browse(list(ids)).exists().ids):
+                error(_("No record found for database id %s", missing), '.id', ids[missing])
+        creates = [num for num, row in enumerate(data) if id_index is None or not row[id_index]]
+
+        # required fields: mapped ones must have a value, the others a default
+        required = self._get_required_fields(model)
+        if creates:
+            unmapped = required - {name.split('/')[0] for name in import_fields}
+            defaults = model.default_get(list(unmapped)) if unmapped else {}
+            for name in sorted(unmapped - set(defaults)):
+                error(_("Missing required value for the field '%s'", model._fields[name].string), name)
+
+        name_create = options.get('name_create_enabled_fields') or {}
+        for index, name in enumerate(import_fields):
+            path = name.split('/')
+            field = model._fields.get(path[0])
+            if field is None:
+                continue
+            if path[0] in required:
+                for num in creates:
+                    if not data[num][index]:
+                        error(_("Missing required value for the field '%s'", field.string), name, num)
+
+            if len(path) > 1 and path[1] == '.id' and field.relational:
+                self._validate_relational_ids(data, index, name, field, error)
+            elif len(path) > 1:
+                continue
+            elif field.type == 'selection':
+                self._validate_selection(data, index, name, field, model, error)
+            elif field.type == 'integer':
+                for num, row in enumerate(data):
+                    try:
+                        if row[index]:
+                            int(row[index])
+                    except ValueError:
+                        error(_("'%s' does not seem to be an integer for field '%s'", row[index], field.string), name, num)
+            elif field.type in ('many2one', 'many2many') and not name_create.get(name):
+                self._validate_relational_names(data, index, name, field, error)
+
+        self._validate_unique_constraints(data, import_fields, id_index, error)
+        return messages
+
+    def _get_required_fields(self, model):
+        """ Names of the fields a new record of ``model`` needs a value for:
+        the required stored fields, and the stored related fields whose
+        target is required (e.g. the ``name`` of the employees, kept on their
+        resource). The links of ``_inherits`` and the fields the model fills
+        in its own ``create`` (``CREATE_FILLED_FIELDS``) are left out.
+        """
+        filled = set(model._inherits.values())
+        for mixin, names in CREATE_FILLED_FIELDS.items():
+            mixin_class = self.env.registry.get(mixin)
+            if mixin_class is not None and isinstance(model, mixin_class):
+                filled |= names
+        required = set()
+        for name, field in model._fields.items():
+            if not field.store or name in filled:
+                continue
+            if field.related:
+                target = field.related_field
+                if target is not None and target.required and not field.readonly:
+                    required.add(name)
+            elif field.required and not field.compute:
+                required.add(name)
+        return required
+
+    def _validate_selection(self, data, index, name, field, model, error):
+        selection = field._description_selection(model.env)
+        accepted = {str(key).lower() for key, label in selection} | {label.lower() for key, label in selection}
+        for num, row in enumerate(data):
+            if row[index] and row[index].lower() not in accepted:
+                error(_("Value '%s' not found in selection field '%s'", row[index], field.string), name, num)
+
+    def _validate_relational_ids(self, data, index, name, field, error):
+        ids = {}
+        for num, row in enumerate(data):
+            for value in (row[index] or '').split(','):
+                if value.strip():
+                    try:
+                        ids.setdefault(int(value), num)
+                    except ValueError:
+                        error(_("Invalid database id '%s' for the field '%s'", value, field.string), name, num)
+        existing = set(self.env[field.comodel_name].browse(list(ids)).exists().ids)
+        for missing in set(ids) - existing:
+            error(_("No matching record found for database id '%s' in field '%s'", missing, field.string),
+                  name, ids[missing])
+
+    def _validate_relational_names(self, data, index, name, field, error):
+        rows = {}
+        for num, row in enumerate(data):
+            values = (row[index] or '').split(',') if field.type == 'many2many' else [row[index] or '']
+            for value in values:
+                value = value.strip()
+                if value:
+                    rows.setdefault(value, num)
+        resolved = self._resolve_names(field.comodel_name, list(rows))
+        for value in rows.keys() - resolved.keys():
+            error(_("No matching record found for name '%s' in field '%s'", value, field.string), name, rows[value])
+
+    def _validate_unique_constraints(self, data, import_fields, id_index, error):
+        """ Rows breaking a ``unique`` SQL constraint of the model whose
+        columns are all imported char or text fields: rows sharing the same
+        values, or holding the values of another existing record. Empty
+        values never conflict (NULL in the database).
+        """
+        model = self.env[self.res_model].with_context(active_test=False)
+        for _constraint, definition, message in model._sql_constraints:
+            match = UNIQUE_CONSTRAINT_REGEX.match(definition)
+            if not match:
+                continue
+            columns = [column.strip().strip('"') for column in match.group(1).split(',')]
+            fields_ = [model._fields.get(column) for column in columns]
+            if not all(field is not None and field.store and field.type in ('char', 'text')
+                       and field.name in import_fields for field in fields_):
+                continue
+            indexes = [import_fields.index(column) for column in columns]
+
+            keys = {}
+            for num, row in enumerate(data):
+                key = tuple(row[index] for index in indexes)
+                if not all(key):
+                    continue
+                if key in keys:
+                    error(message, columns[0], num)
+                    continue
+                record_id = row[id_index] if id_index is not None else ''
+                keys[key] = (num, int(record_id) if record_id.isdigit() else None)
+            if not keys:
+                continue
 
-        return import_result
+            first_values = list({key[0] for key in keys})
+            for record in model.search_read([(columns[0], 'in', first_values)], columns):
+                key = tuple(record[column] or '' for column in columns)
+                if key in keys and keys[key][1] != record['id']:
+                    error(message, columns[0], keys[key][0])
+
+    @api.model
+    def _resolve_names(self, model_name, names):
+        """ Records of ``model_name`` named ``names``, found in bulk.
+
+        :returns: {name: record id}, the names without record are left out
+        """
+        if not names:
+            return {}
+        model = self.env[model_name]
+        rec_name = model._rec_name
+        resolved = {}
+        if rec_name and model._fields[rec_name].store:
+            for record in model.search_read([(rec_name, 'in', names)], [rec_name]):
+                resolved.setdefault(record[rec_name], record['id'])
+        else:
+            for name in names:
+                found = model.name_search(name, operator='=', limit=1)
+                if found:
+                    resolved[name] = found[0][0]
+        return resolved
+
+    def _resolve_relational_names(self, data, import_fields, options):
+        """ Resolve the names of the many2one columns allowed to create their
+        records (``name_create_enabled_fields``) for all the rows at once,
+        instead of one ``name_search`` / ``name_create`` per row in ``load``:
+        the names are searched with one query per column, the missing records
+        are created together, and the column is imported by database id.
+
+        :returns: the fields to load, the resolved columns becoming ``field/.id``
+        """
+        name_create = options.get('name_create_enabled_fields') or {}
+        model = self.env[self.res_model]
+        import_fields = list(import_fields)
+        for index, name in enumerate(import_fields):
+            field = model._fields.get(name)
+            if not name_create.get(name) or field is None or field.type != 'many2one':
+                continue
+            names = {row[index] for row in data if row[index]}
+            ids = self._resolve_names(field.comodel_name, list(names))
+            missing = sorted(names - ids.keys())
+            if missing:
+                try:
+                    with self.env.cr.savepoint():
+                        ids.update(self._create_names(field.comodel_name, missing))
+                except Exception:
+                    # leave the column to load, which reports the errors per row
+                    _logger.info("Could not create the %s records of %s in bulk", field.comodel_name, name,
+                                 exc_info=True)
+                    continue
+            for row in data:
+                row[index] = str(ids[row[index]]) if row[index] else ''
+            import_fields[index] = name + '/.id'
+        return import_fields
+
+    @api.model
+    def _create_names(self, model_name, names):
+        """ Create a record of ``model_name`` for each of ``names``, as
+        ``name_create`` does: in one batch when the model keeps the generic
+        ``name_create``, its name field being the ``_rec_name``, or ``name``
+        when the ``_rec_name`` is computed from it (e.g. the ``complete_name``
+        of the departments). Models overriding ``name_create`` get one call
+        per name.
+
+        :returns: {name: record id}
+        """
+        model = self.env[model_name]
+        name_field = None
+        if type(model).name_create is models.BaseModel.name_create:
+            for field_name in (model._rec_name, 'name'):
+                field = model._fields.get(field_name) if field_name else None
+                if field is not None and field.store and not field.compute and field.type == 'char':
+                    name_field = field_name
+                    break
+        if name_field:
+            records = model.create([{name_field: name} for name in names])
+            return dict(zip(names, records.ids))
+        return {name: model.name_create(name)[0] for name in names}
@@ -0,0 +1,12 @@
+from odoo import fields, models
+
+
+class Employee(models.Model):
+    _inherit = 'hr.employee'
+
+    bitrix_source = fields.Char('Bitrix directory', readonly=True, copy=False)
+    bitrix_identity = fields.Char('Bitrix identity', readonly=True, copy=False, index=True)
+    bitrix_fingerprint = fields.Char('Bitrix fingerprint', readonly=True, copy=False,
+                                     help="Hash of the Bitrix row last imported for this employee")
+    bitrix_missing = fields.Boolean('Missing in Bitrix', readonly=True, copy=False,
+                                    help="The employee was not found in the Bitrix directory during the last sync")
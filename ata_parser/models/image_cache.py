@@ -0,0 +1,186 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """ On-disk cache of the images imported by URL.
+
+    The contents are stored once per sha256 (``objects/ab/abcdef...``) and an
+    index keyed by URL keeps, for each URL, the hash of its content, the
+    ``ETag`` / ``Last-Modified`` validators sent by the server and the
+    dimensions of the image, so a cached image is neither transferred nor
+    decoded again:
+
+    - within ``ttl`` seconds of its last validation it is used as is,
+    - after that a conditional request is made and a ``304`` answer reuses it.
+
+    The least recently used entries are evicted when the contents exceed
+    ``maxbytes``. The cache is shared by the download threads of an import,
+    and by the worker processes of the server: each one only writes the
+    entries it changed, merged with the index on the disk under a file lock
+    (see :meth:`save`).
+    """
+
+    def __init__(self, path, ttl=3600, maxbytes=200 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.lock = threading.Lock()
+        self.index_path = os.path.join(path, 'index.json')
+        self.lock_path = os.path.join(path, 'index.lock')
+        self.index = self._load_index()
+        # {url: entry, or None if removed} changed since the index was loaded
+        self.changes = {}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            _logger.warning("Image cache index %s is unreadable, starting with an empty cache", self.index_path)
+            return {}
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    def _write(self, path, data):
+        # write then rename, readers never see a partial file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, url):
+        with self.lock:
+            entry = self.index.get(url)
+            return dict(entry) if entry else None
+
+    def is_fresh(self, entry):
+        return time.time() - entry['checked_at'] < self.ttl
+
+    def get_validators(self, entry):
+        """ Headers of a conditional request for a cached entry """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def read(self, url, entry):
+        """ Content of a cached entry, None if it is gone from the disk """
+        try:
+            with open(self._object_path(entry['sha256']), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            with self.lock:
+                self.index.pop(url, None)
+                self.changes[url] = None
+            return None
+        with self.lock:
+            if url in self.index:
+                self.index[url]['used_at'] = time.time()
+                self.changes[url] = self.index[url]
+        return content
+
+    def revalidate(self, url):
+        """ The server answered ``304 Not Modified`` for ``url`` """
+        with self.lock:
+            if url in self.index:
+                self.index[url]['checked_at'] = time.time()
+                self.changes[url] = self.index[url]
+
+    def store(self, url, content, headers, size):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            self._write(path, bytes(content))
+        now = time.time()
+        with self.lock:
+            self.index[url] = self.changes[url] = {
+                'sha256': digest,
+                'bytes': len(content),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'width': size[0],
+                'height': size[1],
+                'checked_at': now,
+                'used_at': now,
+            }
+
+    @contextlib.contextmanager
+    def _index_lock(self):
+        """ Exclusive lock of the index between the processes (not on Windows) """
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _merge_entry(current, entry):
+        """ The most recently validated of two entries of the same URL """
+        if current is None:
+            return entry
+        newest = entry if entry['checked_at'] >= current['checked_at'] else current
+        return dict(newest, used_at=max(entry['used_at'], current['used_at']))
+
+    def save(self):
+        """ Merge the entries changed by this process into the index on the
+        disk, which the other processes may have changed meanwhile, evict the
+        least recently used entries above ``maxbytes`` and persist the index.
+
+        Only the objects no entry of the merged index refers to are removed.
+        An object another process stored but did not list yet can go as well:
+        its entry is then dropped by :meth:`read` and the image downloaded
+        again.
+        """
+        with self.lock, self._index_lock():
+            index = self._load_index()
+            for url, entry in self.changes.items():
+                if entry is None:
+                    index.pop(url, None)
+                else:
+                    index[url] = self._merge_entry(index.get(url), entry)
+
+            objects = {}
+            for entry in index.values():
+                objects[entry['sha256']] = entry['bytes']
+            total = sum(objects.values())
+
+            for url, entry in sorted(index.items(), key=lambda item: item[1]['used_at']):
+                if total <= self.maxbytes:
+                    break
+                del index[url]
+                digest = entry['sha256']
+                if any(other['sha256'] == digest for other in index.values()):
+                    continue
+                total -= objects.pop(digest)
+                try:
+                    os.remove(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+
+            self._write(self.index_path, json.dumps(index).encode())
+            self.index = index
+            self.changes = {}
@@ -0,0 +1,84 @@
+IMAGE_FIELDS = ["icon", "image", "logo", "picture"]
+
+# separator used to merge several columns mapped on the same field
+MERGE_SEPARATORS = {
+    'char': ' ',
+    'text': '\n',
+    'many2many': ',',
+}
+# values of a boolean column kept as they are when it has a fallback value
+BOOLEAN_VALUES = frozenset(('0', '1', 'true', 'false'))
+
+
+class ImportColumn:
+    """ A mapped column of the import, resolved once for the whole import.
+
+    :param int index: position of the column in the mapped data
+    :param str name: imported field path (e.g. ``job_id`` or ``parent_id/name``)
+    :param str model: model holding the last field of the path
+    :param dict field: description of that field (``fields_get``), None if
+        the path does not resolve to a field (e.g. ``.id``)
+    :param str parser: ``'date'``, ``'float'``, ``'image'`` or None: how the
+        values are converted before ``load``
+    """
+    __slots__ = ('index', 'name', 'model', 'field', 'field_type', 'parser')
+
+    def __init__(self, index, name, model, field, parser=None):
+        self.index = index
+        self.name = name
+        self.model = model
+        self.field = field
+        self.field_type = field['type'] if field else ''
+        self.parser = parser
+
+
+class ImportField:
+    """ A field of the data sent to ``load``: several columns may be merged
+    into it, and its value may be replaced by a fallback value.
+    """
+    __slots__ = ('name', 'field_type', 'indexes', 'separator', 'fallback')
+
+    def __init__(self, name, field_type, indexes, fallback=None):
+        self.name = name
+        self.field_type = field_type
+        self.indexes = indexes
+        self.separator = MERGE_SEPARATORS.get(field_type)
+        self.fallback = fallback
+
+    def get_fallback_resolver(self):
+        """ Function giving the value to import for a value of the field: the
+        value itself if the field accepts it, the fallback value otherwise.
+        The decision is made once per distinct value.
+        """
+        fallback_value = self.fallback['fallback_value']
+        if self.fallback['field_type'] == 'boolean':
+            accepted = BOOLEAN_VALUES
+        else:
+            accepted = self.fallback['selection_values']
+            if fallback_value == 'skip':
+                # don't set any value if we skip
+                fallback_value = None
+        decisions = {}
+
+        def resolve(value):
+            try:
+                return decisions[value]
+            except KeyError:
+                decision = decisions[value] = value if value.lower() in accepted else fallback_value
+                return decision
+
+        return resolve
+
+
+class ImportPlan:
+    """ Everything the import stages need to know about the mapped columns:
+    built once per import by ``ata_parser.data_import._compile_import_plan``
+    so that per row work does not depend on the size of the model.
+    """
+
+    def __init__(self, columns, fields):
+        self.columns = columns
+        self.fields = fields
+        self.import_fields = [field.name for field in fields]
+        self.has_multi_mapping = len(fields) != len(columns)
+        self.fallback_fields = [(index, field) for index, field in enumerate(fields) if field.fallback]
@@ -0,0 +1,203 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+
+# number of functions kept in the profile of the slowest stage
+PROFILE_LIMIT = 40
+
+
+class ImportStage:
+    """ Totals of a stage of the import pipeline over all its calls """
+    VALUES = ('name', 'calls', 'wall_time', 'cpu_time', 'rows', 'sql_count', 'bytes', 'peak_memory')
+    __slots__ = VALUES + ('running', 'running_start')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        # time during which at least one call of the stage was running: the
+        # calls running at the same time in several threads count once
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.rows = 0
+        self.sql_count = 0
+        self.bytes = 0
+        # KiB: peak of the traced allocations, only when memory is traced
+        self.peak_memory = 0
+        self.running = 0
+        self.running_start = 0.0
+
+    def get_values(self):
+        return {key: getattr(self, key) for key in self.VALUES}
+
+
+class StageTimer:
+    """ One call of a stage, see :meth:`ImportProfiler.stage` """
+    __slots__ = ('profiler', 'stage', 'rows', 'bytes', 'owner', 'cpu_start', 'sql_start', 'profile')
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+        self.rows = 0
+        self.bytes = 0
+        self.profile = None
+
+    def add(self, rows=0, bytes=0):
+        self.rows += rows
+        self.bytes += bytes
+
+    def __enter__(self):
+        profiler = self.profiler
+        # the cursor, the allocations peak and cProfile belong to the thread
+        # running the import, and only the outermost stage uses them
+        self.owner = threading.get_ident() == profiler.thread and not profiler.depth
+        if self.owner:
+            profiler.depth += 1
+            self.sql_start = profiler.get_sql_count()
+            if profiler.trace_memory:
+                profiler.reset_memory_peak()
+            if profiler.profile:
+                self.profile = profiler.profiles.get(self.stage.name)
+                if self.profile is None:
+                    self.profile = profiler.profiles[self.stage.name] = cProfile.Profile()
+                self.profile.enable()
+        stage = self.stage
+        with profiler.lock:
+            if not stage.running:
+                stage.running_start = time.perf_counter()
+            stage.running += 1
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        cpu_time = time.thread_time() - self.cpu_start
+        sql_count = peak_memory = 0
+        if self.owner:
+            if self.profile:
+                self.profile.disable()
+            self.profiler.depth -= 1
+            sql_count = self.profiler.get_sql_count() - self.sql_start
+            if self.profiler.trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1] // 1024
+
+        stage = self.stage
+        with self.profiler.lock:
+            stage.running -= 1
+            if not stage.running:
+                stage.wall_time += time.perf_counter() - stage.running_start
+            stage.calls += 1
+            stage.cpu_time += cpu_time
+            stage.rows += self.rows
+            stage.bytes += self.bytes
+            stage.sql_count += sql_count
+            stage.peak_memory = max(stage.peak_memory, peak_memory)
+
+
+class NullTimer:
+    __slots__ = ()
+
+    def add(self, rows=0, bytes=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class NullProfiler:
+    """ Stands for the profiler when an import is not instrumented """
+
+    def stage(self, name):
+        return NULL_TIMER
+
+
+NULL_TIMER = NullTimer()
+NULL_PROFILER = NullProfiler()
+
+
+class ImportProfiler:
+    """ Per stage instrumentation of an import: wall time, CPU time, rows,
+    SQL queries, bytes downloaded and peak memory of each stage::
+
+        with profiler.stage('fetch') as stage:
+            response = session.get(url)
+            stage.add(bytes=len(response.content))
+
+    Stages can be entered from other threads (e.g. concurrent downloads):
+    their wall time is the time during which at least one of their calls
+    runs, their SQL queries and memory are only measured in the thread that
+    created the profiler. Memory is only measured when the allocations are
+    traced (``profile``).
+
+    :param cr: cursor of the import, to count its queries
+    :param bool profile: also run cProfile on the stages and trace the
+        allocations, to keep the profile of the slowest stage
+    """
+
+    def __init__(self, cr=None, profile=False):
+        self.cr = cr
+        self.profile = profile
+        self.thread = threading.get_ident()
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.profiles = {}
+        self.depth = 0
+        self.trace_memory = False
+        self.started_memory_trace = False
+        self.wall_start = self.wall_time = 0.0
+
+    def start(self):
+        if self.profile:
+            self.trace_memory = True
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_memory_trace = True
+        self.wall_start = time.perf_counter()
+
+    def reset_memory_peak(self):
+        # tracemalloc.reset_peak() only exists from Python 3.9: before, the
+        # trace is restarted instead, when it is the one of the profiler
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        elif self.started_memory_trace:
+            tracemalloc.stop()
+            tracemalloc.start()
+
+    def stop(self):
+        self.wall_time = time.perf_counter() - self.wall_start
+        if self.started_memory_trace:
+            tracemalloc.stop()
+            self.started_memory_trace = False
+        self.trace_memory = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def get_sql_count(self):
+        return getattr(self.cr, 'sql_log_count', 0)
+
+    def stage(self, name):
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = ImportStage(name)
+        return StageTimer(self, stage)
+
+    def get_slowest_stage(self):
+        profiled = [stage for stage in self.stages.values() if stage.name in self.profiles]
+        return max(profiled, key=lambda stage: stage.wall_time, default=None)
+
+    def get_profile_stats(self, stage, limit=PROFILE_LIMIT):
+        """ cProfile report of ``stage``, sorted by cumulative time """
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiles[stage.name], stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return output.getvalue()
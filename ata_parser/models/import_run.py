@@ -0,0 +1,54 @@
+from odoo import api, fields, models
+
+
+class ImportRun(models.Model):
+    _name = 'ata_parser.import_run'
+    _description = 'Import run'
+    _order = 'id desc'
+
+    name = fields.Char('Name', required=True, readonly=True)
+    user_id = fields.Many2one('res.users', 'User', required=True, readonly=True,
+                              default=lambda self: self.env.user)
+    dryrun = fields.Boolean('Test only', readonly=True)
+    success = fields.Boolean('Successful', readonly=True)
+    wall_time = fields.Float('Duration (s)', readonly=True, digits=(16, 3))
+    rows_loaded = fields.Integer('Rows loaded', readonly=True)
+    stage_ids = fields.One2many('ata_parser.import_run.stage', 'run_id', 'Stages', readonly=True)
+    profile_stage = fields.Char('Profiled stage', readonly=True,
+                                help="Slowest stage of the run, whose profile is kept")
+    profile_stats = fields.Text('Profile', readonly=True)
+
+    @api.model
+    def create_from_profiler(self, profiler, values):
+        """ Record the stages measured by an ``ImportProfiler`` """
+        stages = sorted(profiler.stages.values(), key=lambda stage: stage.wall_time, reverse=True)
+        values = dict(values, wall_time=profiler.wall_time, stage_ids=[
+            (0, 0, dict(stage.get_values(), sequence=sequence))
+            for sequence, stage in enumerate(stages)
+        ])
+        slowest = profiler.get_slowest_stage()
+        if slowest:
+            values['profile_stage'] = slowest.name
+            values['profile_stats'] = profiler.get_profile_stats(slowest)
+        return self.create(values)
+
+
+class ImportRunStage(models.Model):
+    _name = 'ata_parser.import_run.stage'
+    _description = 'Import run stage'
+    _order = 'run_id, sequence, id'
+
+    run_id = fields.Many2one('ata_parser.import_run', 'Run', required=True, ondelete='cascade', index=True)
+    sequence = fields.Integer('Sequence')
+    name = fields.Char('Stage', required=True)
+    calls = fields.Integer('Calls')
+    wall_time = fields.Float('Wall time (s)', digits=(16, 3),
+                             help="Time during which the stage ran, its calls running at the same time "
+                                  "(concurrent downloads) counted once")
+    cpu_time = fields.Float('CPU time (s)', digits=(16, 3))
+    rows = fields.Integer('Rows')
+    sql_count = fields.Integer('SQL queries')
+    bytes = fields.Integer('Bytes downloaded')
+    peak_memory = fields.Integer('Peak memory (KiB)',
+                                 help="Peak of the Python allocations during the stage, only measured when "
+                                      "the run is profiled")
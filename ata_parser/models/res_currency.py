@@ -0,0 +1,31 @@
+from odoo import api, models, tools
+
+
+class Currency(models.Model):
+    _inherit = 'res.currency'
+
+    @api.model
+    @tools.ormcache()
+    def _get_import_symbols(self):
+        """ Symbols of the active currencies, used to recognize amounts with
+        a currency symbol in imported floats. Cached until a currency is
+        created, modified or deleted.
+        """
+        return frozenset(self.sudo().with_context(active_test=True).search([]).mapped('symbol'))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        currencies = super().create(vals_list)
+        self.clear_caches()
+        return currencies
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'symbol' in vals or 'active' in vals:
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
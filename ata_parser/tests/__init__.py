@@ -0,0 +1,2 @@
+from . import test_validate_import
+from . import test_upsert_records
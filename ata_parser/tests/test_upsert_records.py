@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+from ..wizard.parser_bitrix_import import SYNC_FIELDS
+
+
+class TestUpsertRecords(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.wizard = self.env['ata_parser.bitrix_import'].create({})
+        self.Employee = self.env['hr.employee']
+        self.olena = self.Employee.create({'name': 'Olena Kovalenko', 'work_email': 'olena@example.com',
+                                           'work_phone': '100'})
+        self.taras = self.Employee.create({'name': 'Taras Melnyk', 'work_email': 'taras@example.com',
+                                           'work_phone': '100'})
+
+    def test_counts(self):
+        result = self.wizard.upsert_records('work_email', [
+            {'work_email': 'olena@example.com', 'name': 'Olena Kovalenko', 'work_phone': '200'},
+            {'work_email': 'taras@example.com', 'name': 'Taras Melnyk', 'work_phone': '100'},
+            {'work_email': 'ivan@example.com', 'name': 'Ivan Shevchenko', 'work_phone': '200'},
+        ])
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (1, 1, 1))
+        self.assertEqual(self.olena.work_phone, '200')
+        ivan = self.Employee.search([('work_email', '=', 'ivan@example.com')])
+        self.assertEqual(ivan.name, 'Ivan Shevchenko')
+        self.assertEqual(sorted(result['ids']), sorted((self.olena | self.taras | ivan).ids))
+
+    def test_grouped_writes(self):
+        # the same new phone for both employees is written once
+        employees = self.olena | self.taras
+        Employee = type(self.Employee)
+        with patch.object(Employee, 'write', autospec=True, side_effect=Employee.write) as write:
+            result = self.wizard.upsert_records('id', [
+                {'id': employee.id, 'work_phone': '300'} for employee in employees])
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(result['updated'], 2)
+        self.assertEqual(employees.mapped('work_phone'), ['300', '300'])
+
+    def test_bulk_fields(self):
+        employees = self.olena | self.taras
+        self.wizard.upsert_records('id', [
+            {'id': employee.id, 'bitrix_identity': employee.work_email, 'bitrix_fingerprint': str(employee.id)}
+            for employee in employees], bulk_fields=SYNC_FIELDS)
+        self.assertEqual(employees.mapped('bitrix_identity'), ['olena@example.com', 'taras@example.com'])
+        self.assertEqual(employees.mapped('bitrix_fingerprint'), [str(employee.id) for employee in employees])
+        self.assertEqual(employees.mapped('bitrix_source'), [False, False])
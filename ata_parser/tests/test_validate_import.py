@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+from ..wizard.parser_bitrix_import import BITRIX_RULES, SYNC_FIELDS
+
+
+class TestValidateImport(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.wizard = self.env['ata_parser.bitrix_import'].create({})
+        self.titles = [title for title, field in BITRIX_RULES]
+
+    def make_row(self, **values):
+        """ A Bitrix row, the columns given by their field name """
+        return [values.get(field, '') if field else '' for title, field in BITRIX_RULES]
+
+    def validate(self, rows, extra_fields=()):
+        result = self.wizard.save_rows(rows, self.titles, dryrun=True, extra_fields=extra_fields)
+        return result['messages']
+
+    def test_well_formed_rows(self):
+        rows = [
+            self.make_row(name='Olena Kovalenko', work_email='olena@example.com', birthday='01-02-1990',
+                          job_id='Accountant', department_id='Finance'),
+            self.make_row(name='Taras Melnyk', mobile_phone='+380 50 000 00 00', job_id='Accountant'),
+        ]
+        self.assertEqual(self.validate(rows), [])
+
+    def test_well_formed_sync_rows(self):
+        rows = [row + ['bitrix.example.com', str(num), 'fingerprint', '0'] for num, row in enumerate([
+            self.make_row(name='Olena Kovalenko', department_id='Finance'),
+            self.make_row(name='Taras Melnyk'),
+        ])]
+        self.assertEqual(self.validate(rows, extra_fields=SYNC_FIELDS), [])
+
+    def test_missing_name(self):
+        rows = [self.make_row(work_email='nobody@example.com')]
+        messages = self.validate(rows)
+        self.assertEqual([message['field'] for message in messages], ['name'])
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import re
+from html.parser import HTMLParser
+
+from lxml import etree
+
+_logger = logging.getLogger(__name__)
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    _logger.debug("BeautifulSoup is not installed, the 'bs4' parser backend is not available")
+    BeautifulSoup = None
+
+# elements html.parser (and BeautifulSoup on top of it) never expects a closing tag for
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+    'image', 'isindex', 'nextid', 'spacer',
+}
+# text inside these elements is not part of get_text() in BeautifulSoup
+STRING_CONTAINERS = {'script', 'style', 'template'}
+NON_DIGITS = re.compile(r'\D')
+# BeautifulSoup replaces a text node of these characters only by a newline
+# (if it has one) or a space
+ASCII_SPACES = str.maketrans('', '', '\x20\x0a\x09\x0c\x0d')
+# (tag, class) of the elements of the Bitrix employee grid, chains of them
+# are looked for one into the other
+GRID_TAGS = {
+    'title_row': ('th', 'main-grid-cell-head'),
+    'title_cell': [
+        ('div', 'main-grid-cell-inner'),
+        ('span', 'main-grid-cell-head-container'),
+        ('span', "main-grid-head-title"),
+    ],
+    'data_row': ('tr', 'main-grid-row'),
+    'data_cell': ('td', 'main-grid-cell'),
+    'data_content': [
+        ('div', 'main-grid-cell-inner'),
+        ('span', 'main-grid-cell-content'),
+    ],
+    'data_content_ref': [('a', '')],
+    'data_content_img': [
+        ('div', 'intranet-user-list-userpic'),
+        ('i', ''),
+    ],
+    # links to the other pages, and total number of rows
+    'pager_page': ('a', 'main-ui-pagination-page'),
+    'pager_total': ('span', 'main-grid-panel-content-text'),
+}
+
+
+def get_img_url(style):
+    """ Extract the url of a ``background-image: url('...')`` inline style """
+    img_style = 'background-image:'
+    img_urls = [kv[len(img_style):] for kv in style.split(';') if kv.startswith(img_style)]
+    img_url = img_urls[0].strip()
+    return img_url[len('url(\''):-len('\')')]
+
+
+def get_pager_number(text):
+    """ Number shown by a pager element ('12', '1 234'), None if it is not one (e.g. 'Next') """
+    digits = NON_DIGITS.sub('', text)
+    return int(digits) if digits and not any(c.isalpha() for c in text) else None
+
+
+def collapse_space(text):
+    """ A text node as BeautifulSoup keeps it: '\\n' or ' ' if it is only whitespace """
+    if text.translate(ASCII_SPACES):
+        return text
+    return '\n' if '\n' in text else ' '
+
+
+def match_tag(spec, tag, attrs):
+    """ Same rule as ``BeautifulSoup.find(tag, class_=value)``: any of the
+    element classes (or the whole class attribute) equals the value.
+    """
+    spec_tag, spec_class = spec
+    if tag != spec_tag:
+        return False
+    if not spec_class:
+        return True
+    classes = attrs.get('class') or ''
+    return classes == spec_class or spec_class in classes.split()
+
+
+class FindChain:
+    """ Event-driven equivalent of :func:`find_tags`: follows a chain
+    of ``find`` calls, each one looking for the first matching descendant of
+    the element found by the previous one.
+    """
+    __slots__ = ('steps', 'depths', 'done', 'attrs', 'strings')
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.depths = []
+        self.done = False
+        self.attrs = None
+        self.strings = []
+
+    @property
+    def found(self):
+        return len(self.depths) == len(self.steps)
+
+    @property
+    def open(self):
+        return self.found and not self.done
+
+    def start(self, depth, tag, attrs):
+        if self.done or self.found:
+            return
+        if match_tag(self.steps[len(self.depths)], tag, attrs):
+            self.depths.append(depth)
+            if self.found:
+                self.attrs = attrs
+
+    def end(self, depth):
+        # closing the last matched element either ends the found element
+        # or, if the chain is incomplete, means nothing more can match
+        if not self.done and self.depths and self.depths[-1] == depth:
+            self.done = True
+
+    def data(self, data):
+        if self.open:
+            self.strings.append(data)
+
+    def get_text(self, strip=False):
+        if strip:
+            return ''.join(s.strip() for s in self.strings if s.strip())
+        return ''.join(collapse_space(s) for s in self.strings)
+
+
+class GridCell:
+    """ Cell being read: the ``find`` chains of its content, link and picture,
+    and the places of its value in the rows containing it
+    """
+    __slots__ = ('depth', 'content', 'ref', 'img', 'slots')
+
+    def __init__(self, depth, tags, rows):
+        self.depth = depth
+        self.content = FindChain(tags['data_content'])
+        self.ref = FindChain(tags['data_content_ref'])
+        self.img = FindChain(tags['data_content_img'])
+        self.slots = []
+        for row in rows:
+            self.slots.append((row, len(row)))
+            row.append('')
+
+    def start(self, depth, tag, attrs):
+        content_found = self.content.found
+        self.content.start(depth, tag, attrs)
+        if content_found and self.content.open:
+            self.ref.start(depth, tag, attrs)
+            self.img.start(depth, tag, attrs)
+
+    def end(self, depth):
+        self.img.end(depth)
+        self.ref.end(depth)
+        self.content.end(depth)
+
+    def data(self, data):
+        self.content.data(data)
+        self.ref.data(data)
+
+    def get_value(self):
+        if self.img.found:
+            style = self.img.attrs.get('style')
+            return get_img_url(style) if style else ''
+        if self.ref.found:
+            return self.ref.get_text(strip=True)
+        if self.content.found:
+            return self.content.get_text(strip=True)
+        return ''
+
+    def close(self):
+        value = self.get_value()
+        for row, index in self.slots:
+            row[index] = value
+
+
+class GridPage:
+    """ Titles and raw rows of a page of the grid, with what its pager shows:
+    the highest page number it links to and the total number of rows (None
+    when the page has no pager)
+    """
+    __slots__ = ('titles', 'rows', 'page_count', 'total')
+
+    def __init__(self, titles, rows, page_count=None, total=None):
+        self.titles = titles
+        self.rows = rows
+        self.page_count = page_count
+        self.total = total
+
+
+class GridExtractor:
+    """ Single pass extractor of the Bitrix ``main-grid`` table.
+
+    Produces the same titles and raw rows as the BeautifulSoup traversal of
+    :func:`get_soup_titles` / :func:`get_soup_rows` without building a
+    document tree: only the elements of the grid are looked at. As with
+    ``find_all``, rows and cells may overlap on malformed markup: a cell
+    belongs to every row it is nested in, and a nested row is a row of its
+    own.
+
+    The extractor only consumes ``start`` / ``end`` / ``data`` / ``comment``
+    events, it is used as parser target of lxml or fed by
+    :class:`HTMLParserDriver`.
+    """
+
+    def __init__(self, tags, with_titles=True):
+        self.tags = tags
+        self.with_titles = with_titles
+        self.watched_tags = {tag for key, spec in tags.items()
+                             for tag, _class in (spec if isinstance(spec, list) else [spec])}
+        self.pager_tags = [(key, tags[key]) for key in ('pager_page', 'pager_total') if key in tags]
+        self.stack = []
+        self.containers = 0
+        self.strings = []
+        self.titles = []
+        self.rows = []
+        self.title = None
+        self.title_depth = None
+        # rows and cells being read, innermost last: (depth, values) and GridCell
+        self.open_rows = []
+        self.open_cells = []
+        self.pager = None
+        self.pager_depth = None
+        self.pager_strings = []
+        self.page_count = None
+        self.total = None
+
+    def start(self, tag, attrs):
+        if self.strings:
+            self.flush()
+        self.stack.append(tag)
+        if tag in STRING_CONTAINERS:
+            self.containers += 1
+        if tag in self.watched_tags:
+            self.start_element(len(self.stack), tag, attrs)
+        # void elements have no content: close them right away
+        if tag in VOID_ELEMENTS:
+            self.pop()
+
+    def end(self, tag):
+        if self.strings:
+            self.flush()
+        if tag in VOID_ELEMENTS or tag not in self.stack:
+            return
+        while self.stack[-1] != tag:
+            self.pop()
+        self.pop()
+
+    def data(self, data):
+        if not self.containers and (self.title or self.open_cells or self.pager):
+            self.strings.append(data)
+
+    def comment(self, text):
+        # a comment ends the text node before it, as in BeautifulSoup
+        if self.strings:
+            self.flush()
+
+    def flush(self):
+        # a text node can be reported in several pieces (e.g. around entities)
+        data = ''.join(self.strings)
+        self.strings = []
+        if self.title:
+            self.title.data(data)
+        for cell in self.open_cells:
+            cell.data(data)
+        if self.pager:
+            self.pager_strings.append(data)
+
+    def close(self):
+        if self.strings:
+            self.flush()
+        # unclosed elements are closed at the end of the document
+        while self.stack:
+            self.pop()
+        return GridPage(self.titles, self.rows, self.page_count, self.total)
+
+    def start_element(self, depth, tag, attrs):
+        if self.title:
+            self.title.start(depth, tag, attrs)
+        elif self.with_titles and match_tag(self.tags['title_row'], tag, attrs):
+            self.title = FindChain(self.tags['title_cell'])
+            self.title_depth = depth
+
+        for cell in self.open_cells:
+            cell.start(depth, tag, attrs)
+        if self.open_rows and match_tag(self.tags['data_cell'], tag, attrs):
+            self.open_cells.append(GridCell(depth, self.tags, [values for _depth, values in self.open_rows]))
+        if match_tag(self.tags['data_row'], tag, attrs):
+            # rows come out in document order, as their cells are filled in
+            values = []
+            self.rows.append(values)
+            self.open_rows.append((depth, values))
+
+        if not self.pager:
+            for key, spec in self.pager_tags:
+                if match_tag(spec, tag, attrs):
+                    self.pager = key
+                    self.pager_depth = depth
+                    break
+
+    def pop(self):
+        depth = len(self.stack)
+        tag = self.stack.pop()
+        if tag in STRING_CONTAINERS:
+            self.containers -= 1
+
+        for cell in self.open_cells:
+            cell.end(depth)
+        if self.open_cells and self.open_cells[-1].depth == depth:
+            self.open_cells.pop().close()
+        if self.open_rows and self.open_rows[-1][0] == depth:
+            self.open_rows.pop()
+
+        if self.pager and depth == self.pager_depth:
+            number = get_pager_number(''.join(self.pager_strings))
+            if number is not None:
+                if self.pager == 'pager_page':
+                    self.page_count = max(self.page_count or 0, number)
+                else:
+                    self.total = number
+            self.pager = None
+            self.pager_strings = []
+
+        if self.title:
+            self.title.end(depth)
+            if depth == self.title_depth:
+                self.titles.append(self.title.get_text() if self.title.found else '')
+                self.title = None
+
+
+class HTMLParserDriver(HTMLParser):
+    """ Feed a :class:`GridExtractor` with the pure python ``html.parser``,
+    the tokenizer BeautifulSoup uses with ``'html.parser'``.
+    """
+
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {k: v if v is not None else '' for k, v in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def handle_comment(self, data):
+        self.target.comment(data)
+
+    def close(self):
+        super().close()
+        return self.target.close()
+
+
+def find_tags(parent, tags):
+    """ Follow a chain of BeautifulSoup ``find`` calls from ``parent``, each
+    one looking into the element found by the previous one.
+
+    :param tags: list of (tag, class), an empty class matches any element
+    :returns: the last element found, None if one of them is missing
+    """
+    element = None
+    if not parent:
+        return element
+    for tag, attr_value in tags:
+        element = parent.find(tag, class_=attr_value) if attr_value else parent.find(tag)
+        if element is None:
+            break
+        else:
+            parent = element
+    return element
+
+
+def get_soup_titles(bs, tags):
+    """ Titles of the grid columns of the BeautifulSoup document ``bs`` """
+    tag, attr_value = tags['title_row']
+    titles = []
+    for cell_head in bs.find_all(tag, class_=attr_value):
+        elem = find_tags(cell_head, tags['title_cell'])
+        titles.append(elem.get_text() if elem is not None else '')
+    return titles
+
+
+def get_soup_rows(bs, tags):
+    """ Raw rows of the grid of the BeautifulSoup document ``bs`` """
+    rows = []
+    row_tag, row_class = tags['data_row']
+    cell_tag, cell_class = tags['data_cell']
+    for item in bs.find_all(row_tag, class_=row_class):
+        values = []
+        for cell in item.find_all(cell_tag, class_=cell_class):
+            elem = find_tags(cell, tags['data_content'])
+            ref = find_tags(elem, tags['data_content_ref'])
+            img = find_tags(elem, tags['data_content_img'])
+            if img:
+                style = img.attrs.get('style')
+                value = get_img_url(style) if style else ''
+            elif ref:
+                value = ref.get_text(strip=True)
+            elif elem:
+                value = elem.get_text(strip=True)
+            else:
+                value = ''
+            values.append(value)
+        rows.append(values)
+    return rows
+
+
+def get_soup_pager(bs, tags):
+    """ (highest page number linked, total number of rows) of the pager of
+    the BeautifulSoup document ``bs``
+    """
+    tag, attr_value = tags['pager_page']
+    numbers = [get_pager_number(link.get_text()) for link in bs.find_all(tag, class_=attr_value)]
+    page_count = max((number for number in numbers if number is not None), default=None)
+    tag, attr_value = tags['pager_total']
+    total = bs.find(tag, class_=attr_value)
+    return page_count, get_pager_number(total.get_text()) if total is not None else None
+
+
+def extract_grid(html, tags, with_titles=True, tokenizer='html.parser'):
+    """ Extract the titles and the raw rows of a page of the grid.
+
+    :param str tokenizer: ``'html.parser'`` (pure python, the default),
+        ``'lxml'`` (libxml2, faster, opt-in) or ``'bs4'`` (BeautifulSoup tree
+        traversal, slow). ``'html.parser'`` gives the same titles and rows as
+        ``'bs4'``, malformed markup included. libxml2 first applies the HTML recovery rules, so
+        ``'lxml'`` may differ on malformed rows: an unclosed ``<tr>`` is
+        closed by the next one instead of containing it.
+    :rtype: GridPage
+    """
+    if tokenizer == 'bs4':
+        bs = BeautifulSoup(html, 'html.parser')
+        page_count, total = get_soup_pager(bs, tags)
+        return GridPage(get_soup_titles(bs, tags) if with_titles else [], get_soup_rows(bs, tags),
+                        page_count, total)
+    extractor = GridExtractor(tags, with_titles)
+    if tokenizer == 'lxml':
+        parser = etree.HTMLParser(target=extractor)
+    else:
+        parser = HTMLParserDriver(extractor)
+    parser.feed(html)
+    return parser.close()
@@ -1,196 +1,420 @@
 # -*- coding: utf-8 -*-
 
+import collections
+import hashlib
+import itertools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
-from bs4 import BeautifulSoup
+from urllib3.util.retry import Retry
 
 from odoo import fields, models
 
+from ..models.import_profiler import NULL_PROFILER, ImportProfiler
+from .parser_bitrix_grid import (
+    GRID_TAGS, BeautifulSoup, extract_grid, find_tags, get_img_url, get_soup_pager, get_soup_rows, get_soup_titles,
+)
+from .parser_bitrix_replay import RecordingSession, ReplaySession
+
+_logger = logging.getLogger(__name__)
+
+# Bitrix column -> hr.employee field, in the order of the columns
+BITRIX_RULES = [
+    ("", ""),
+    ("Фото", "image_1920"),
+    ("Ім'я та прізвище", "name"),
+    ("Ім'я", ""),
+    ("Прізвище", ""),
+    ("По батькові", ""),
+    ("E-Mail", "work_email"),
+    ("Дата реєстрації", "departure_date"),
+    ("Дата народження", "birthday"),
+    ("Стать", "gender"),
+    ("Мобільний телефон", "mobile_phone"),
+    ("Місто", "additional_note"),
+    ("Робочий телефон", "work_phone"),
+    ("Посада", "job_id"),
+    ("Підрозділ", "department_id"),
+    ("Внутрішній телефон", ""),
+    ("ІПН", ""),
+    ("Skype", "notes"),
+    ("Дата прийняття на роботу", "work_permit_expiration_date"),
+    ("", ""),
+]
+# columns identifying an employee in Bitrix, the first non-empty one is used
+IDENTITY_TITLES = ('E-Mail', "Ім'я та прізвище")
+# fields written by the incremental sync next to the imported columns
+SYNC_FIELDS = ['bitrix_source', 'bitrix_identity', 'bitrix_fingerprint', 'bitrix_missing']
+
+MONTHS = {month: number for number, month in enumerate([
+    'січня', 'лютого', 'березня', 'квітня', 'травня', 'червня',
+    'липня', 'серпня', 'вересня', 'жовтня', 'листопада', 'грудня'], 1)}
+GENDERS = {'чоловіча': 'Male', 'жіноча': 'Female'}
+# Bitrix only shows the day and the month of the birthdays
+BIRTHDAY_YEAR = 2000
+
+
+def convert_birthday(value):
+    """ '5 березня' -> '05-03-2000', other values are left as is """
+    parts = value.split(' ')
+    if len(parts) == 2:
+        day = int(parts[0])
+        month = MONTHS.get(parts[1])
+        if day and month:
+            return '{:0>2d}-{:0>2d}-{:0>4d}'.format(day, month, BIRTHDAY_YEAR)
+    return value
+
+
+def convert_date(value):
+    """ '05.03.2015 10:00:00' -> '05-03-2015' """
+    date_only = value.split(' ')[0]
+    return date_only.replace('.', '-') if date_only else ''
+
+
+def convert_gender(value):
+    return GENDERS.get(value, 'Other')
+
+
+# (title predicate, converter) of the converted columns, the first matching
+# rule is used: insert rules in ParserBitrix.converters to convert other
+# columns (phones, emails, flags...)
+VALUE_CONVERTERS = [
+    (lambda title: title == 'Дата народження', convert_birthday),
+    (lambda title: title.startswith('Дата'), convert_date),
+    (lambda title: title.startswith('Стать'), convert_gender),
+]
+
+
+def get_converter(title, converters=VALUE_CONVERTERS):
+    for match, converter in converters:
+        if match(title):
+            return converter
+    return None
+
 
 class ParserBitrix:
 
-    def __init__(self):
+    def __init__(self, url=None, login='', passwd='', pages=13, workers=1):
         self.host = 'https://it-artel.bitrix24.ua/'
-        self.url = self.host + 'company/'
+        self.url = url or self.host + 'company/'
         self.headers = {
             'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
             'user-agent': 'Mozilla/5.0 (Windows NT 6.1; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36 OPR/86.0.4363.59',
         }
-        self.login = ''
-        self.passwd = ''
-        self.pages = 13
+        self.login = login
+        self.passwd = passwd
+        # pages fetched at most when the first page has no pager
+        self.pages = pages
+        # concurrent fetch: number of pages requested at the same time,
+        # 1 keeps the sequential behaviour
+        self.workers = workers
+        self.pages_fetched = 0
+        # every page of the directory was received by the last run, see
+        # iter_pages
+        self.complete = False
+        # read from the pager of the first page: the highest page it links
+        # to (a lower bound of the number of pages, pagers only show a few
+        # pages around the current one) and the total number of rows
+        self.page_count = None
+        self.total_rows = None
+        self.retries = 3
+        self.backoff_factor = 0.5
+        self.timeout = 60
+        self.session = None
+        # called with the number of pages and rows of each fetched page
+        self.progress_callback = None
+        # ImportProfiler measuring the fetch and parse stages
+        self.profiler = NULL_PROFILER
+        # PageFixtures the fetched pages are written to, or read from
+        # instead of the network (see parser_bitrix_replay)
+        self.record_fixtures = None
+        self.replay_fixtures = None
+        # 'html.parser' / 'lxml': single pass grid extractor on top of that
+        # tokenizer, 'bs4': BeautifulSoup tree traversal. 'html.parser' reads
+        # the pages as 'bs4' does; 'lxml' is faster but may differ on
+        # malformed markup, see extract_grid
+        self.backend = 'html.parser'
         self.request = None
         self.titles = []
+        # parsed rows, as tuples of values in the order of the titles
         self.data = []
-        self.content = []
-        self.tags = {
-            'title_row': ('th', 'main-grid-cell-head'),
-            'title_cell': [
-                ('div', 'main-grid-cell-inner'),
-                ('span', 'main-grid-cell-head-container'),
-                ('span', "main-grid-head-title"),
-            ],
-            'data_row': ('tr', 'main-grid-row'),
-            'data_cell': ('td', 'main-grid-cell'),
-            'data_content': [
-                ('div', 'main-grid-cell-inner'),
-                ('span', 'main-grid-cell-content'),
-            ],
-            'data_content_ref': [('a', '')],
-            'data_content_img': [
-                ('div', 'intranet-user-list-userpic'),
-                ('i', ''),
-            ],
-        }
+        self.converters = list(VALUE_CONVERTERS)
+        # converter of each column, resolved from the titles
+        self.column_converters = []
+        self.tags = dict(GRID_TAGS)
 
     @staticmethod
     def get_tags(parent, tags):
-        element = None
-        if not parent:
-            return element
-        for tag, attr_value in tags:
-            element = parent.find(tag, class_=attr_value) if attr_value else parent.find(tag)
-            if element is None:
-                break
-            else:
-                parent = element
-        return element
+        return find_tags(parent, tags)
 
     @staticmethod
     def get_img_content(img):
         img_content = ''
         img_attr = 'style'
-        img_style = 'background-image:'
         if img.attrs.get(img_attr):
-            img_urls = [kv[len(img_style):] for kv in img.attrs.get(img_attr).split(';') if
-                        kv.startswith(img_style)]
-            img_url = img_urls[0].strip()
-            img_content = img_url[len('url(\''):-len('\')')]
+            img_content = get_img_url(img.attrs.get(img_attr))
         return img_content
 
     @staticmethod
     def convert_value(title, value):
-        months = ['січня', 'лютого', 'березня', 'квітня', 'травня', 'червня',
-                  'липня', 'серпня', 'вересня', 'жовтня', 'листопада', 'грудня']
-        y = 2000
-        genders_ua = ['чоловіча', 'жіноча']
-        genders_en = ['Male', 'Female', 'Other']
-
-        is_modified = False
-        if title == 'Дата народження':
-            d = None
-            m = None
-            parts = value.split(' ')
-            if len(parts) == 2:
-                d = int(parts[0])
-                month = parts[1]
-                m = months.index(month) + 1 if month in months else None
-            if d and m:
-                value = '{:0>2d}-{:0>2d}-{:0>4d}'.format(d, m, y)
-                is_modified = True
-        elif title.startswith('Дата'):
-            parts = value.split(' ')
-            date_only = parts[0] if len(parts) > 0 else None
-            value = date_only.replace('.', '-') if date_only else ''
-            is_modified = True
-        elif title.startswith('Стать'):
-            value = genders_en[genders_ua.index(value)] if value in genders_ua else genders_en[2]
-            is_modified = True
-
-        return is_modified, value
+        """ Convert a single value, rows are converted by :meth:`convert_rows` """
+        converter = get_converter(title)
+        if converter is None:
+            return False, value
+        return True, converter(value)
 
-    def get_titles(self, bs):
-        row_tag = self.tags['title_row']
-        cell_tags = self.tags['title_cell']
+    def resolve_converters(self):
+        self.column_converters = [get_converter(title, self.converters) for title in self.titles]
 
-        tag, attr_value = row_tag
-        cell_heads = bs.find_all(tag, class_=attr_value)
-        for cell_head in cell_heads:
-            elem = ParserBitrix.get_tags(cell_head, cell_tags)
-            head_title = elem.get_text() if elem is not None else ''
-            self.titles.append(head_title)
-        # print(self.titles)
+    def get_titles(self, bs):
+        self.titles.extend(get_soup_titles(bs, self.tags))
+        self.resolve_converters()
 
     def get_data(self, bs):
-        result = False
-
-        row_tag = self.tags['data_row']
-        cell_tag = self.tags['data_cell']
-        content_tags = self.tags['data_content']
-        content_ref_tags = self.tags['data_content_ref']
-        content_img_tags = self.tags['data_content_img']
-
-        tag, attr_value = row_tag
-        items = bs.find_all(tag, class_=attr_value)
-        for item in items:
-            values = []
-            tag, attr_value = cell_tag
-            cells = item.find_all(tag, class_=attr_value)
-            for cell in cells:
-                elem = ParserBitrix.get_tags(cell, content_tags)
-                ref = ParserBitrix.get_tags(elem, content_ref_tags)
-                img = ParserBitrix.get_tags(elem, content_img_tags)
-                if img:
-                    value = ParserBitrix.get_img_content(img)
-                elif ref:
-                    value = ref.get_text(strip=True)
-                elif elem:
-                    value = elem.get_text(strip=True)
-                else:
-                    value = ''
-                values.append(value)
-            fields_values = [value for value in values if value]
-            if fields_values:
-                self.data.append(values)
-                result = True
-            else:
+        return get_soup_rows(bs, self.tags)
+
+    def get_pager(self, bs):
+        """ (highest page number linked, total number of rows) of the pager """
+        return get_soup_pager(bs, self.tags)
+
+    def get_last_page(self, rows_per_page):
+        """ Number of pages of the directory when the pager of the first
+        page tells the total number of rows, None otherwise.
+        """
+        if self.total_rows and rows_per_page:
+            return -(-self.total_rows // rows_per_page)
+        return None
+
+    def convert_rows(self, raw_rows):
+        converters = [(index, converter) for index, converter in enumerate(self.column_converters) if converter]
+        rows = []
+        for values in raw_rows:
+            if not any(values):
                 continue
-            # print(values)
-
-            content_item = {}
-            for i in range(0, len(self.titles)):
-                title = self.titles[i]
-                value = values[i]
-                is_modified, value = ParserBitrix.convert_value(title, value)
-                if is_modified:
-                    values[i] = value
-                content_item[title] = value
-
-            self.content.append(content_item)
-
-        return result
+            for index, converter in converters:
+                values[index] = converter(values[index])
+            rows.append(tuple(values))
+
+        return rows
+
+    def get_session(self):
+        """ Build an HTTP session shared by all page requests: connections
+        are kept alive between pages and failed requests are retried with
+        an exponential backoff.
+        """
+        if self.replay_fixtures:
+            return ReplaySession(self.replay_fixtures)
+        session = RecordingSession(self.record_fixtures) if self.record_fixtures else requests.Session()
+        session.headers.update(self.headers)
+        session.auth = HTTPBasicAuth(self.login, self.passwd)
+        retry = Retry(total=self.retries,
+                      backoff_factor=self.backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=max(self.workers, 1),
+                              max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def fetch_page(self, page):
+        params = {'page': f'page-{page}'} if page > 1 else None
+        with self.profiler.stage('fetch') as stage:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+            stage.add(bytes=len(response.content))
+        return response
 
     def get_page(self, params=None):
-        self.request = requests.get(self.url,
-                                    headers=self.headers,
-                                    params=params,
-                                    auth=HTTPBasicAuth(self.login, self.passwd))
+        with self.profiler.stage('fetch') as stage:
+            self.request = self.session.get(self.url, params=params, timeout=self.timeout)
+            stage.add(bytes=len(self.request.content))
 
     def get_content(self):
-        bs = BeautifulSoup(self.request.text, 'html.parser')
+        with self.profiler.stage('parse_html') as stage:
+            if self.backend == 'bs4':
+                bs = BeautifulSoup(self.request.text, 'html.parser')
 
-        if not self.titles:
-            self.get_titles(bs)
+                if not self.titles:
+                    self.get_titles(bs)
+                    self.page_count, self.total_rows = self.get_pager(bs)
 
-        result = self.get_data(bs)
-        return result
+                raw_rows = self.get_data(bs)
+            else:
+                page = extract_grid(self.request.text, self.tags,
+                                    with_titles=not self.titles, tokenizer=self.backend)
+                if not self.titles:
+                    self.titles = page.titles
+                    self.page_count, self.total_rows = page.page_count, page.total
+                    self.resolve_converters()
+                raw_rows = page.rows
+            stage.add(rows=len(raw_rows))
+
+        with self.profiler.stage('convert') as stage:
+            rows = self.convert_rows(raw_rows)
+            stage.add(rows=len(rows))
+        return rows
+
+    def get_first_page(self):
+        """ Fetch and parse the first page, whose pager tells how many pages
+        follow (see :meth:`get_last_page`).
+
+        :returns: its rows, None if there are none
+        """
+        self.page_count = self.total_rows = None
+        self.get_page()
+        if self.request.status_code != 200:
+            return None
+        return self.get_content() or None
+
+    def get_page_range_end(self, rows_per_page):
+        """ Last page to request: the one of :meth:`get_last_page`, ``pages``
+        without pager, None (until the directory ends) when the pager only
+        links to some of the pages.
+        """
+        last_page = self.get_last_page(rows_per_page)
+        if last_page is not None:
+            return last_page
+        if self.page_count:
+            return None
+        return self.pages
+
+    def check_page(self, page, rows, previous_rows, rows_per_page):
+        """ What the parsed ``rows`` of ``page`` mean for the directory, the
+        rows of the previous page being ``previous_rows``:
+
+        - ``'next'``: rows of the directory, more may follow
+        - ``'last'``: rows of the last page, the directory is complete
+        - ``'end'``: past the last page, the directory is complete
+        - ``'stop'``: the directory may go on but can't be read further
+
+        With a total number of rows, the directory ends on the page it gives.
+        Otherwise the pages the pager links to are read, then the next ones
+        while they are full, and only an empty page ends the directory.
+        """
+        last_page = self.get_last_page(rows_per_page)
+        if last_page is not None:
+            if not rows:
+                return 'stop'
+            return 'last' if page >= last_page else 'next'
+        linked = self.page_count or 1
+        if not rows:
+            # an empty page linked by the pager: the directory changed
+            return 'end' if page > linked else 'stop'
+        if page > linked and (len(previous_rows) < rows_per_page or rows == previous_rows):
+            # a page after a short one, or the same page again: the server
+            # does not answer the pages past the end with an empty one
+            return 'stop'
+        return 'next'
+
+    def iter_pages_sequential(self):
+        rows = self.get_first_page()
+        if not rows:
+            return
+        yield rows
+
+        rows_per_page = len(rows)
+        end = self.get_page_range_end(rows_per_page)
+        pages = itertools.count(2) if end is None else range(2, end + 1)
+        for page in pages:
+            self.get_page(params={'page': f'page-{page}'})
+            if self.request.status_code != 200:
+                return
+            previous_rows, rows = rows, self.get_content()
+            status = self.check_page(page, rows, previous_rows, rows_per_page)
+            if status in ('next', 'last'):
+                yield rows
+            if status != 'next':
+                self.complete = status in ('last', 'end')
+                return
+
+    def iter_pages_concurrent(self):
+        """ Fetch the first page, then the next ones concurrently while the
+        oldest one is parsed, so rows still come out in page order.
+
+        Up to ``self.workers`` pages are kept in flight, so that the pages
+        waiting to be parsed stay bounded. The pages are read until
+        :meth:`check_page` tells the directory ended, no page past the last
+        one is requested when the pager tells the total number of rows.
+        """
+        rows = self.get_first_page()
+        if not rows:
+            return
+        yield rows
+
+        rows_per_page = len(rows)
+        end = self.get_page_range_end(rows_per_page)
+        pages = itertools.count(2) if end is None else iter(range(2, end + 1))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = collections.deque()
+            for page in itertools.islice(pages, self.workers):
+                pending.append((page, executor.submit(self.fetch_page, page)))
+
+            try:
+                while pending:
+                    page, future = pending.popleft()
+                    self.request = future.result()
+                    for next_page in itertools.islice(pages, 1):
+                        pending.append((next_page, executor.submit(self.fetch_page, next_page)))
+                    if self.request.status_code != 200:
+                        return
+                    previous_rows, rows = rows, self.get_content()
+                    status = self.check_page(page, rows, previous_rows, rows_per_page)
+                    if status in ('next', 'last'):
+                        yield rows
+                    if status != 'next':
+                        self.complete = status in ('last', 'end')
+                        return
+            finally:
+                for page, future in pending:
+                    future.cancel()
+
+    def iter_pages(self):
+        """ Yield the parsed rows of the directory page by page, so they can
+        be consumed while the next pages are still downloading.
+
+        Once they are all consumed, ``complete`` tells whether the whole
+        directory was received: the first page had rows, and either every
+        page of the total number of rows given by its pager was received or
+        the run stopped on an empty page (see :meth:`check_page`). A failed
+        request, or running out of the ``pages`` probed without pager, leaves
+        it False.
+        """
+        self.titles = []
+        self.column_converters = []
+        self.pages_fetched = 0
+        self.complete = False
+
+        with self.get_session() as self.session:
+            pages = self.iter_pages_concurrent() if self.workers > 1 else self.iter_pages_sequential()
+            try:
+                for rows in pages:
+                    self.pages_fetched += 1
+                    if self.progress_callback:
+                        self.progress_callback(pages=1, rows=len(rows))
+                    yield rows
+            finally:
+                pages.close()
+
+    def iter_rows(self):
+        for rows in self.iter_pages():
+            yield from rows
 
     def do_parse(self):
 
-        self.titles = []
         self.data = []
-        self.content = []
 
-        page = 1
+        for rows in self.iter_pages():
+            self.data.extend(rows)
 
-        self.get_page()
-        while self.request.status_code == 200:
-            if not self.get_content():
-                break
-            page += 1
-            if page > self.pages:
-                break
-            self.get_page(params={'page': f'page-{page}'})
+    @property
+    def content(self):
+        """ The parsed rows as dicts keyed by title, built on each access """
+        return [dict(zip(self.titles, values)) for values in self.data]
 
 
 class BitrixImport(models.TransientModel):
@@ -200,51 +424,150 @@ class BitrixImport(models.TransientModel):
     url = fields.Char('URL')
     login = fields.Char('Login')
     password = fields.Char('Password')
+    workers = fields.Integer('Concurrent requests', default=4)
+    chunk_size = fields.Integer('Rows per batch', default=100,
+                                help="Stream the rows into the database in batches of this size while "
+                                     "the next pages are downloaded. Use 0 to download everything first, "
+                                     "then load it at once.")
+    continue_on_error = fields.Boolean('Skip invalid rows', default=True,
+                                       help="Import the valid employees even if some rows can't be imported")
+    incremental = fields.Boolean('Only new and changed employees', default=True,
+                                 help="Skip the employees whose Bitrix data did not change since the last import")
+    flag_missing = fields.Boolean('Flag missing employees',
+                                  help="Mark the employees not found in Bitrix anymore as missing, only when "
+                                       "every page of the directory was received")
+    portal_ids = fields.Many2many('ata_parser.bitrix_portal', string='Portals',
+                                  help="Import these portals, at the same time, instead of the URL above")
+    profile = fields.Boolean('Profile the import',
+                             help="Keep the cProfile report and the memory peak of the slowest stage "
+                                  "in the import history (slows the import down)")
+    run_id = fields.Many2one('ata_parser.import_run', 'Last run', readonly=True)
+
+    def get_parser(self, progress=None, profiler=NULL_PROFILER):
+        parser_bitrix = ParserBitrix(self.url, self.login, self.password, workers=self.workers)
+        parser_bitrix.progress_callback = progress
+        parser_bitrix.profiler = profiler
+        return parser_bitrix
 
-    def import_data(self):
-        parser_bitrix = ParserBitrix()
-        # parser_bitrix.url = self.url
-        parser_bitrix.login = self.login
-        parser_bitrix.passwd = self.password
+    def import_data(self, progress=None, profiler=NULL_PROFILER):
+        parser_bitrix = self.get_parser(progress, profiler)
         parser_bitrix.do_parse()
         return parser_bitrix
 
+    def get_rules(self):
+        return BITRIX_RULES
+
     def update_record(self, identity_field, values):
-        dm = self.env['hr.employee']
-        identity_value = values[identity_field]
-        record = dm.search([(identity_field, '=', identity_value)], limit=1)
-        if not record:  # create new record
-            dm.create(values)
-        else:  # update current record
-            record.write(values)
-
-    def save_data(self, parser_obj, dryrun=False):
-        rules = [
-            ("", ""),
-            ("Фото", "image_1920"),
-            ("Ім'я та прізвище", "name"),
-            ("Ім'я", ""),
-            ("Прізвище", ""),
-            ("По батькові", ""),
-            ("E-Mail", "work_email"),
-            ("Дата реєстрації", "departure_date"),
-            ("Дата народження", "birthday"),
-            ("Стать", "gender"),
-            ("Мобільний телефон", "mobile_phone"),
-            ("Місто", "additional_note"),
-            ("Робочий телефон", "work_phone"),
-            ("Посада", "job_id"),
-            ("Підрозділ", "department_id"),
-            ("Внутрішній телефон", ""),
-            ("ІПН", ""),
-            ("Skype", "notes"),
-            ("Дата прийняття на роботу", "work_permit_expiration_date"),
-            ("", ""),
-        ]
+        return self.upsert_records(identity_field, [values])
 
-        # identity_field = "name"
+    @staticmethod
+    def is_value_changed(record, field, value, current_value):
+        if field.type in ('one2many', 'many2many'):
+            # commands can't be compared with the current value
+            return True
+        return field.convert_to_cache(value, record, validate=False) != \
+            field.convert_to_cache(current_value, record, validate=False)
+
+    def upsert_records(self, identity_field, vals_list, bulk_fields=()):
+        """ Create or update the employees identified by ``identity_field``
+        (``name``, ``work_email``, ``id``...) with a number of queries that
+        does not depend on the number of employees: the existing employees
+        and their current values are read at once, the new ones are created
+        in one batch, and the changed values are written grouped by field
+        and value, one ``write`` for all the employees getting the same
+        value. Values equal to the current ones are not written.
+
+        The ``bulk_fields``, plain columns nothing depends on and whose value
+        differs for every employee (e.g. the sync fingerprint), are written
+        with a single UPDATE.
+
+        :param list(dict) vals_list: values of the employees, each with ``identity_field``
+        :returns: ids of the employees and number of ``created``, ``updated``
+                  and ``unchanged`` ones
+        :rtype: dict
+        """
+        dm = self.env['hr.employee'].with_context(active_test=False)
+
+        # several values for the same employee: the last ones win
+        vals_by_identity = {}
+        for vals in vals_list:
+            vals_by_identity.setdefault(vals[identity_field], {}).update(vals)
+
+        field_names = sorted({name for vals in vals_by_identity.values() for name in vals} | {identity_field})
+        index = {}
+        for current in dm.search_read([(identity_field, 'in', list(vals_by_identity))], field_names):
+            index.setdefault(current[identity_field], current)
+
+        to_create = []
+        to_write = {}
+        bulk_rows = {}
+        ids = []
+        updated = unchanged = 0
+        for identity, vals in vals_by_identity.items():
+            vals = {name: value for name, value in vals.items() if name != 'id'}
+            current = index.get(identity)
+            if current is None:  # create new record
+                to_create.append(vals)
+                continue
+            # update current record
+            ids.append(current['id'])
+            record = dm.browse(current['id'])
+            changes = {name: value for name, value in vals.items()
+                       if self.is_value_changed(record, dm._fields[name], value, current[name])}
+            if not changes:
+                unchanged += 1
+                continue
+            updated += 1
+            bulk = {name: changes.pop(name) for name in bulk_fields if name in changes}
+            if bulk:
+                bulk_rows[current['id']] = bulk
+            for name, value in changes.items():
+                to_write.setdefault((name, repr(value)), (name, value, []))[2].append(current['id'])
+
+        if to_create:
+            ids.extend(dm.create(to_create).ids)
+        for name, value, record_ids in to_write.values():
+            dm.browse(record_ids).write({name: value})
+        if bulk_rows:
+            self.write_columns(dm, bulk_fields, bulk_rows)
+
+        return {
+            'ids': ids,
+            'created': len(to_create),
+            'updated': updated,
+            'unchanged': unchanged,
+        }
 
-        data_fields = [f for t, f in rules]
+    @staticmethod
+    def write_columns(model, names, vals_by_id):
+        """ Write the plain columns ``names`` of the records of ``model``
+        with one UPDATE, ``vals_by_id`` giving the values of each record (the
+        columns missing from them keep their value).
+        """
+        model.flush(names)
+        columns = [model._fields[name] for name in names]
+        rows = [[record_id] + [vals.get(name) for name in names] + [name in vals for name in names]
+                for record_id, vals in vals_by_id.items()]
+        assignments = ', '.join(
+            '"{0}" = CASE WHEN v."set_{0}" THEN v."{0}"::{1} ELSE t."{0}" END'.format(
+                field.name, field.column_type[1])
+            for field in columns)
+        aliases = ', '.join(['"id"'] + ['"%s"' % name for name in names] + ['"set_%s"' % name for name in names])
+        model.env.cr.execute(
+            'UPDATE "{table}" AS t SET {assignments} FROM (VALUES {values}) AS v({aliases}) '
+            'WHERE t.id = v.id'.format(
+                table=model._table, assignments=assignments, aliases=aliases,
+                values=', '.join(['%s'] * len(rows))),
+            [tuple(row) for row in rows])
+        records = model.browse(list(vals_by_id))
+        records.invalidate_cache(names, records.ids)
+        records.modified(names)
+
+    def save_data(self, parser_obj, dryrun=False, progress=None, rules=None):
+        return self.save_rows(parser_obj.data, parser_obj.titles, dryrun, self.chunk_size, progress=progress,
+                              profiler=parser_obj.profiler, rules=rules)
+
+    def get_import_options(self, dryrun=False, chunk_size=None, progress=None, profiler=NULL_PROFILER):
         options = {'skip': 0,
                    'limit': None,
                    'date_format': '%d-%m-%Y',
@@ -257,14 +580,36 @@ class BitrixImport(models.TransientModel):
                    'import_skip_records': [],
                    'has_headers': False
                    }
+        if chunk_size is not None:
+            options['chunk_size'] = chunk_size
+        if self.continue_on_error and not dryrun:
+            options['continue_on_error'] = True
+        if progress:
+            options['progress_callback'] = progress
+        if profiler is not NULL_PROFILER:
+            options['profiler'] = profiler
+        return options
+
+    def save_rows(self, rows, titles, dryrun=False, chunk_size=None, extra_fields=(), progress=None,
+                  profiler=NULL_PROFILER, rules=None):
+        rules = rules or self.get_rules()
+
+        # identity_field = "name"
+
+        data_fields = [f for t, f in rules] + list(extra_fields)
+        options = self.get_import_options(dryrun, chunk_size, progress, profiler)
 
         import_record = self.env['ata_parser.data_import'].create({
             'res_model': 'hr.employee',
         })
 
+        if dryrun:
+            # checked without loading anything, see DataImport.validate_import
+            return import_record.validate_import(rows, titles, data_fields, options)
+
         import_result = import_record.execute_import(
-            parser_obj.data,
-            parser_obj.titles,
+            rows,
+            titles,
             data_fields,
             options,
             dryrun
@@ -274,11 +619,300 @@ class BitrixImport(models.TransientModel):
 
         return import_result
 
+    @staticmethod
+    def is_import_ok(import_result):
+        messages = import_result['messages']
+        has_errors = any(isinstance(m, dict) and m.get('type') == 'error' for m in messages)
+        return bool((import_result.get('ids') or not messages) and not has_errors)
+
+    @staticmethod
+    def get_import_message(import_result):
+        return 'Test successfully done!' if BitrixImport.is_import_ok(import_result) else '\n'.join(
+            m['message'] if isinstance(m, dict) else m for m in import_result['messages'])
+
+    def stream_data(self, dryrun=False, progress=None, profiler=NULL_PROFILER):
+        parser_object = self.get_parser(progress, profiler)
+        return self.save_rows(parser_object.iter_rows(), parser_object.titles, dryrun, self.chunk_size,
+                              progress=progress, profiler=profiler)
+
+    @staticmethod
+    def get_identity(titles, values):
+        for title in IDENTITY_TITLES:
+            if title in titles:
+                identity = values[titles.index(title)].strip()
+                if identity:
+                    return identity
+        return None
+
+    @staticmethod
+    def get_fingerprint(values):
+        normalized = [value.strip() if isinstance(value, str) else value for value in values]
+        return hashlib.sha1(json.dumps(normalized, ensure_ascii=False).encode()).hexdigest()
+
+    def get_sync_index(self, source, identities=None):
+        """ {Bitrix identity: employee} of the employees already imported from
+        ``source``. With ``identities``, the employees never synchronized yet
+        whose email or name is one of them are adopted as well, so the first
+        incremental import does not duplicate them.
+        """
+        Employee = self.env['hr.employee'].with_context(active_test=False)
+        sync_fields = ['bitrix_identity', 'bitrix_fingerprint', 'bitrix_missing']
+        if identities is None:
+            employees = Employee.search_read(
+                [('bitrix_source', '=', source), ('bitrix_identity', '!=', False)], sync_fields)
+            return {employee['bitrix_identity']: employee for employee in employees}
+
+        index = {}
+        employees = Employee.search_read(
+            [('bitrix_identity', '=', False), '|', ('work_email', 'in', identities), ('name', 'in', identities)],
+            sync_fields + ['work_email', 'name'])
+        for employee in employees:
+            identity = employee['work_email'] if employee['work_email'] in identities else employee['name']
+            index.setdefault(identity, employee)
+        return index
+
+    def sync_data(self, progress=None, profiler=NULL_PROFILER):
+        parser_object = self.get_parser(progress, profiler)
+        return self.sync_rows(parser_object, parser_object.iter_rows(), progress=progress, profiler=profiler)
+
+    def sync_rows(self, parser_object, rows, rules=None, progress=None, profiler=NULL_PROFILER):
+        """ Incremental import of the ``rows`` parsed by ``parser_object``:
+        every row is hashed and only the rows whose hash differs from the one
+        stored on the employee at the last import are loaded: the new
+        employees with ``load``, the changed ones updated in bulk by
+        :meth:`upsert_rows`.
+
+        The rows are synchronized ``chunk_size`` rows at a time while they
+        are parsed: only the identities seen so far are kept for the whole
+        directory.
+        """
+        rules = rules or self.get_rules()
+        source = parser_object.url
+        index = self.get_sync_index(source)
+
+        seen = set()
+        results = []
+        counts = collections.Counter()
+        chunk = []
+        for values in rows:
+            identity = self.get_identity(parser_object.titles, values)
+            if not identity or identity in seen:
+                _logger.warning("Bitrix row skipped, without identity or duplicated: %s", identity)
+                continue
+            seen.add(identity)
+            chunk.append((identity, values))
+            if self.chunk_size and len(chunk) >= self.chunk_size:
+                results.extend(self.sync_chunk(parser_object.titles, chunk, index, source, rules, counts,
+                                               progress, profiler))
+                chunk = []
+        if chunk:
+            results.extend(self.sync_chunk(parser_object.titles, chunk, index, source, rules, counts,
+                                           progress, profiler))
+        _logger.info("Bitrix sync of %s: %d rows, %d new, %d changed",
+                     source, len(seen), counts['new'], counts['changed'])
+
+        if self.flag_missing:
+            if parser_object.complete:
+                self.flag_missing_employees(index, seen)
+            else:
+                _logger.warning("Bitrix directory %s was not entirely received, missing employees not flagged",
+                                source)
+                results.append({'ids': [], 'messages': [{
+                    'type': 'warning',
+                    'message': "The Bitrix directory %s was not entirely received: "
+                               "the missing employees were not flagged." % source,
+                }]})
+
+        return self.merge_results(results)
+
+    def sync_chunk(self, titles, chunk, index, source, rules, counts, progress=None, profiler=NULL_PROFILER):
+        """ Load the new and changed rows of ``chunk``, a list of (identity, values)
+
+        :returns: the results of the loads
+        """
+        width = len(rules)
+        new_rows = {}
+        changed_rows = []
+        for identity, values in chunk:
+            fingerprint = self.get_fingerprint(values)
+            employee = index.get(identity)
+            # the sync columns come right after the mapped ones
+            row = (list(values) + [''] * width)[:width] + [source, identity, fingerprint, '']
+            if not employee:
+                new_rows[identity] = row
+            elif employee['bitrix_fingerprint'] != fingerprint:
+                changed_rows.append(row + [str(employee['id'])])
+
+        # employees imported before the incremental sync
+        if new_rows:
+            adopted = self.get_sync_index(source, list(new_rows))
+            for identity, employee in adopted.items():
+                changed_rows.append(new_rows.pop(identity) + [str(employee['id'])])
+        counts['new'] += len(new_rows)
+        counts['changed'] += len(changed_rows)
+
+        results = []
+        if new_rows:
+            results.append(self.save_rows(list(new_rows.values()), titles,
+                                          chunk_size=self.chunk_size, extra_fields=SYNC_FIELDS,
+                                          progress=progress, profiler=profiler, rules=rules))
+        if changed_rows:
+            results.append(self.upsert_rows(changed_rows, SYNC_FIELDS + ['.id'], progress, profiler, rules))
+        return results
+
+    def upsert_rows(self, rows, extra_fields, progress=None, profiler=NULL_PROFILER, rules=None):
+        """ Update the employees of ``rows``, identified by their ``.id``
+        column, with :meth:`upsert_records`: the rows are converted as the
+        import does it, then written in bulk. With ``continue_on_error`` the
+        rows that can't be converted are skipped, otherwise nothing is written.
+
+        :returns: the result of an import, with the counts of :meth:`upsert_records`
+        """
+        rules = rules or self.get_rules()
+        data_fields = [f for t, f in rules] + list(extra_fields)
+        options = self.get_import_options(progress=progress, profiler=profiler)
+        import_record = self.env['ata_parser.data_import'].create({
+            'res_model': 'hr.employee',
+        })
+        # the records created for the relational names go if nothing is written
+        self.env['base'].flush()
+        self.env.cr.execute('SAVEPOINT bitrix_upsert')
+        result = None
+        try:
+            vals_list, messages = import_record.convert_import(rows, data_fields, options)
+            failed = {message.get('record') for message in messages if message.get('type') == 'error'}
+            if not failed or self.continue_on_error:
+                vals_list = [vals for num, vals in enumerate(vals_list) if num not in failed]
+                with profiler.stage('load') as stage:
+                    result = self.upsert_records('id', vals_list, bulk_fields=SYNC_FIELDS)
+                    stage.add(rows=len(vals_list))
+                self.env['base'].flush()
+        except Exception as e:
+            _logger.info("Bitrix employees could not be updated in bulk", exc_info=True)
+            messages = [{
+                'type': 'error',
+                'message': str(e),
+                'record': False,
+                'rows': {'from': 0, 'to': len(rows) - 1},
+            }]
+        if result is None:
+            self.env.cr.execute('ROLLBACK TO SAVEPOINT bitrix_upsert')
+            self.env['base'].invalidate_cache()
+            return {'ids': False, 'messages': messages}
+        self.env.cr.execute('RELEASE SAVEPOINT bitrix_upsert')
+
+        _logger.info("Bitrix employees upserted: %(created)d created, %(updated)d updated, %(unchanged)d unchanged",
+                     result)
+        if progress:
+            progress(loaded=len(result['ids']))
+        return dict(result, messages=messages)
+
+    @staticmethod
+    def merge_results(results):
+        return {
+            'ids': [id_ for result in results for id_ in (result.get('ids') or [])],
+            'messages': [message for result in results for message in result['messages']],
+        }
+
+    def import_portals(self, dryrun=False, progress=None, profiler=NULL_PROFILER):
+        """ Import every portal of ``portal_ids``: the portals are fetched and
+        parsed at the same time, each one is loaded as soon as it is parsed.
+        Loading stays in this thread, the only one using the cursor, so the
+        portals are loaded one after the other.
+        """
+        portals = self.portal_ids
+        # another import of the same portals fails until this one is committed
+        portals.lock_for_import()
+        results = []
+        with ThreadPoolExecutor(max_workers=len(portals)) as executor:
+            futures = {}
+            for portal in portals:
+                parser_object = portal.get_parser()
+                parser_object.profiler = profiler
+                futures[executor.submit(parser_object.do_parse)] = (portal, parser_object)
+
+            for future in as_completed(futures):
+                portal, parser_object = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    _logger.exception("Bitrix portal %s could not be parsed", portal.name)
+                    results.append({'ids': [], 'messages': [
+                        {'type': 'error', 'message': '%s: %s' % (portal.name, e)}]})
+                    continue
+                if progress:
+                    progress(pages=parser_object.pages_fetched, rows=len(parser_object.data))
+
+                rules = portal.get_rules()
+                parser_object.titles, parser_object.data = portal.map_rows(parser_object.titles, parser_object.data)
+                if self.incremental and not dryrun:
+                    results.append(self.sync_rows(parser_object, parser_object.data, rules, progress, profiler))
+                else:
+                    results.append(self.save_data(parser_object, dryrun, progress, rules))
+        return self.merge_results(results)
+
+    def flag_missing_employees(self, index, seen):
+        Employee = self.env['hr.employee'].with_context(active_test=False)
+        missing = [employee['id'] for identity, employee in index.items()
+                   if identity not in seen and not employee['bitrix_missing']]
+        found = [employee['id'] for identity, employee in index.items()
+                 if identity in seen and employee['bitrix_missing']]
+        Employee.browse(missing).write({'bitrix_missing': True})
+        Employee.browse(found).write({'bitrix_missing': False})
+
+    def run_import(self, dryrun=False, progress=None):
+        """ Scrape the directory and load it, ``progress`` is called with the
+        number of pages fetched, rows parsed and rows loaded as they go. The
+        time spent in each stage is recorded in the import history (``run_id``).
+        """
+        with ImportProfiler(self.env.cr, profile=self.profile) as profiler:
+            if self.portal_ids:
+                import_result = self.import_portals(dryrun, progress, profiler)
+            elif dryrun:
+                import_result = self.save_data(self.import_data(progress, profiler), True, progress)
+            elif self.incremental:
+                import_result = self.sync_data(progress, profiler)
+            elif self.chunk_size:
+                import_result = self.stream_data(progress=progress, profiler=profiler)
+            else:
+                import_result = self.save_data(self.import_data(progress, profiler), progress=progress)
+
+        self.run_id = self.env['ata_parser.import_run'].create_from_profiler(profiler, {
+            'name': 'Bitrix import (test)' if dryrun else 'Bitrix import',
+            'dryrun': dryrun,
+            'success': self.is_import_ok(import_result),
+            'rows_loaded': len(import_result.get('ids') or []),
+        })
+        return import_result
+
+    def get_job_values(self):
+        values = self.read(['url', 'login', 'password', 'workers', 'chunk_size',
+                            'continue_on_error', 'incremental', 'flag_missing', 'profile', 'portal_ids'])[0]
+        del values['id']
+        return values
+
+    def queue_import(self, dryrun=False):
+        """ Run the import in the background (see ``ata_parser.bitrix_import_job``)
+        and open its job to follow the progress.
+        """
+        job = self.env['ata_parser.bitrix_import_job'].queue(self.get_job_values(), dryrun)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'ata_parser.bitrix_import_job',
+            'res_id': job.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def queue_import_employees(self):
+        return self.queue_import()
+
+    def queue_test_import_employees(self):
+        return self.queue_import(dryrun=True)
+
     def import_employees(self):
-        parser_object = self.import_data()
-        import_result = self.save_data(parser_object)
-        is_ok = True if import_result['ids'] else False
-        user_message = 'Test successfully done!' if is_ok else '\n'.join(import_result['messages'])
+        import_result = self.run_import()
+        user_message = self.get_import_message(import_result)
         message = {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
@@ -291,10 +925,8 @@ class BitrixImport(models.TransientModel):
         return message
 
     def test_import_employees(self):
-        parser_object = self.import_data()
-        import_result = self.save_data(parser_object, True)
-        is_ok = True if import_result['ids'] else False
-        user_message = 'Test successfully done!' if is_ok else '\n'.join(import_result['messages'])
+        import_result = self.run_import(dryrun=True)
+        user_message = self.get_import_message(import_result)
         # 'fadeout': 'slow'|'fast'|'no'
         message_effect = {
             'effect': {
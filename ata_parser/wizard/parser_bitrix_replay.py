@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+""" Record the pages of the Bitrix employee list once, then replay them from
+the disk or from a local HTTP server, to work on ``ParserBitrix`` without
+network access.
+"""
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class PageFixtures:
+    """ Directory of recorded pages: ``page-<n>.html`` files and an
+    ``index.json`` holding the url they were fetched from and, for each
+    page, its status and encoding.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index_path = os.path.join(path, 'index.json')
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {'url': None, 'pages': {}}
+
+    @staticmethod
+    def get_page_number(params):
+        """ Page requested with the ``params`` of ``ParserBitrix.get_page`` """
+        page = (params or {}).get('page')
+        if isinstance(page, list):
+            page = page[0]
+        return int(page[len('page-'):]) if page else 1
+
+    def get_page_path(self, page):
+        return os.path.join(self.path, 'page-%d.html' % page)
+
+    def write_page(self, page, content, status=200, encoding='utf-8', url=None):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.get_page_path(page), 'wb') as f:
+            f.write(content)
+        with self.lock:
+            if url and not self.index['url']:
+                self.index['url'] = url
+            self.index['pages'][str(page)] = {'status': status, 'encoding': encoding, 'bytes': len(content)}
+
+    def read_page(self, page):
+        """ (status, encoding, content) of a recorded page, None if it was not recorded """
+        entry = self.index['pages'].get(str(page))
+        if not entry:
+            return None
+        with open(self.get_page_path(page), 'rb') as f:
+            return entry['status'], entry['encoding'], f.read()
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self.lock, open(self.index_path, 'w') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+
+
+class RecordingSession(requests.Session):
+    """ HTTP session writing every page it fetches to ``fixtures`` """
+
+    def __init__(self, fixtures):
+        super().__init__()
+        self.fixtures = fixtures
+
+    def request(self, method, url, params=None, **kwargs):
+        response = super().request(method, url, params=params, **kwargs)
+        # the url of the list, without the page parameter
+        base_url = urlsplit(url)._replace(query='').geturl()
+        self.fixtures.write_page(self.fixtures.get_page_number(params), response.content,
+                                 response.status_code, response.encoding or 'utf-8', base_url)
+        return response
+
+    def close(self):
+        super().close()
+        self.fixtures.save()
+
+
+class ReplaySession:
+    """ Stands for the HTTP session of ``ParserBitrix``: pages are read from
+    ``fixtures``, the pages never recorded are answered with a 404.
+    """
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.headers = CaseInsensitiveDict()
+        self.auth = None
+
+    def get(self, url, params=None, **kwargs):
+        page = self.fixtures.read_page(self.fixtures.get_page_number(params))
+        status, encoding, content = page or (404, 'utf-8', b'')
+        response = requests.Response()
+        response.status_code = status
+        response.encoding = encoding
+        response._content = content
+        response.url = url
+        response.headers['Content-Type'] = 'text/html; charset=%s' % encoding
+        return response
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        page = self.server.fixtures.read_page(self.server.fixtures.get_page_number(parse_qs(url.query)))
+        if page is None:
+            self.send_error(404)
+            return
+        status, encoding, content = page
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=%s' % encoding)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """ Local HTTP server answering the requests of ``ParserBitrix`` with
+    recorded pages, to also measure the HTTP stack without the network::
+
+        with FixtureServer(PageFixtures(path)) as server:
+            parser.url = server.url
+    """
+    daemon_threads = True
+
+    def __init__(self, fixtures, host='127.0.0.1', port=0):
+        super().__init__((host, port), FixtureRequestHandler)
+        self.fixtures = fixtures
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/company/' % (host, port)
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
@@ -0,0 +1,2 @@
+# the tests of the addons need an odoo server, they are run by odoo-bin
+collect_ignore_glob = ['*/tests/*']
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+""" Time the recompute of openacademy.session.attendees_count on many
+sessions: counting the attendees read for every session (the former
+compute), against the single GROUP BY query of ``_count_attendees``.
+
+The sessions are created in a test database then rolled back:
+
+    python openacademy/benchmarks/bench_attendees_count.py -c odoo.conf -d bench --sessions 10000
+    python openacademy/benchmarks/bench_attendees_count.py -c odoo.conf -d bench --attendees 50 --output after.json
+
+The database needs the openacademy module installed. Other arguments are
+given to the odoo configuration.
+"""
+import argparse
+import json
+import random
+import time
+
+
+def bootstrap(parser):
+    args, odoo_args = parser.parse_known_args()
+    import odoo
+    odoo.tools.config.parse_config(odoo_args)
+    odoo.modules.module.initialize_sys_path()
+    return args
+
+
+def get_env(dbname):
+    import odoo
+    from odoo import api, SUPERUSER_ID
+    registry = odoo.registry(dbname)
+    return api.Environment(registry.cursor(), SUPERUSER_ID, {})
+
+
+def measure(func, repeat, setup):
+    """ Best wall time of ``repeat`` calls of ``func``, ``setup`` is called
+    before each run and not timed
+    """
+    best = None
+    for _i in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def create_sessions(env, count, partners, attendees, seed):
+    """ ``count`` sessions of up to ``attendees`` attendees among ``partners``
+    new partners; the attendance is inserted in SQL to keep the setup short.
+    """
+    rnd = random.Random(seed)
+    partner_ids = env['res.partner'].create([{'name': 'Attendee %d' % i} for i in range(partners)]).ids
+    sessions = env['openacademy.session'].create([
+        {'name': 'Session %d' % i, 'number_of_seats': attendees} for i in range(count)
+    ])
+    field = sessions._fields['attendees_ids']
+    rows = [
+        (session_id, partner_id)
+        for session_id in sessions.ids
+        for partner_id in rnd.sample(partner_ids, rnd.randint(0, min(attendees, partners)))
+    ]
+    for start in range(0, len(rows), 10000):
+        chunk = rows[start:start + 10000]
+        env.cr.execute(
+            'INSERT INTO {} ({}, {}) VALUES {}'.format(
+                field.relation, field.column1, field.column2, ', '.join(['%s'] * len(chunk))),
+            chunk)
+    return sessions, len(rows)
+
+
+def compute_by_len(sessions):
+    """ The former compute: reads the attendees of every session """
+    for line in sessions:
+        line.attendees_count = len(line.attendees_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--partners', type=int, default=500, help="partners the attendees are drawn from")
+    parser.add_argument('--attendees', type=int, default=20, help="maximum attendees of a session")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measure, the best one is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = bootstrap(parser)
+
+    import odoo
+    env = get_env(odoo.tools.config['db_name'])
+    results = []
+    try:
+        sessions, attendances = create_sessions(env, args.sessions, args.partners, args.attendees, args.seed)
+        sessions.flush()
+        counts = {}
+
+        def setup():
+            sessions.invalidate_cache()
+            sessions.write({'attendees_count': 0})
+            sessions.flush()
+            sessions.invalidate_cache()
+
+        for name, compute in [('len', compute_by_len), ('group_by', type(sessions)._compute_attendees_count)]:
+            def run():
+                compute(sessions)
+                sessions.flush(['attendees_count', 'taken_seats'])
+            seconds = measure(run, args.repeat, setup)
+            counts[name] = sessions.mapped('attendees_count')
+            results.append({
+                'name': 'attendees_count[%d].%s' % (len(sessions), name),
+                'seconds': seconds,
+                'attendances': attendances,
+                'sessions_per_sec': round(len(sessions) / seconds) if seconds else None,
+            })
+    finally:
+        env.cr.rollback()
+        env.cr.close()
+
+    if counts['len'] != counts['group_by']:
+        raise SystemExit("the two computes do not count the same attendees")
+    for result in results:
+        print('%-40s %10.4fs  %s sessions/s' % (result['name'], result['seconds'], result['sessions_per_sec']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,9 @@ class Session(models.Model):
     start_date = fields.Date(string='Start date', default=lambda self: fields.Date.today())
     duration = fields.Integer(string='Duration')
     number_of_seats = fields.Integer(string='Number of seats')
-    taken_seats = fields.Float(compute='_compute_taken_seats')
+    # stored, so that the lists and the dashboard graphs read and aggregate
+    # it in SQL; it only follows the stored count of attendees
+    taken_seats = fields.Float(compute='_compute_taken_seats', store=True, group_operator='avg')
     instructor_id = fields.Many2one('res.partner',
                                     string='Instructor',
                                     domain=['|', ('instructor', '=', True),
@@ -22,15 +24,50 @@ class Session(models.Model):
     attendees_ids = fields.Many2many('res.partner', string='Attendees')
     attendees_count = fields.Integer(string='Count of attendees', compute='_compute_attendees_count', store=True)
 
-    @api.depends('number_of_seats', 'attendees_ids')
+    @api.depends('number_of_seats', 'attendees_count')
     def _compute_taken_seats(self):
         for line in self:
-            line.taken_seats = (len(line.attendees_ids) / line.number_of_seats) * 100 if line.number_of_seats else 0
+            line.taken_seats = (line.attendees_count / line.number_of_seats) * 100 if line.number_of_seats else 0
 
-    @api.depends('attendees_ids')
+    # archived attendees are not counted
+    @api.depends('attendees_ids', 'attendees_ids.active')
     def _compute_attendees_count(self):
+        counts = self._count_attendees()
         for line in self:
-            line.attendees_count = len(line.attendees_ids)
+            # new records (onchange) are only in the cache
+            line.attendees_count = counts.get(line.id, 0) if line.id else len(line.attendees_ids)
+
+    def _count_attendees(self):
+        """ Number of attendees of each stored session of ``self``, counted in a
+        single GROUP BY query on the relation table instead of reading the
+        attendees of every session. Archived partners are not counted, as in
+        ``attendees_ids``.
+
+        :returns: {session id: number of attendees}, without the sessions
+            having no attendee
+        """
+        ids = tuple(id_ for id_ in self._ids if id_)
+        if not ids:
+            return {}
+        field = self._fields['attendees_ids']
+        self.flush(['attendees_ids'], self.browse(ids))
+        partners = self.env[field.comodel_name]
+        partners.flush(['active'])
+        query = """
+            SELECT rel.{column1}, COUNT(*)
+              FROM {relation} rel
+              JOIN {table} partner ON partner.id = rel.{column2}
+             WHERE rel.{column1} IN %s {active}
+          GROUP BY rel.{column1}
+        """.format(
+            relation=field.relation, column1=field.column1, column2=field.column2, table=partners._table,
+            active='AND partner.active' if self._context.get('active_test', True) else '',
+        )
+        counts = {}
+        for sub_ids in self._cr.split_for_in_conditions(ids):
+            self._cr.execute(query, [sub_ids])
+            counts.update(self._cr.fetchall())
+        return counts
 
     @api.onchange('number_of_seats')
     def _onchange_number_of_seats(self):
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+""" The grid extractor backends of ata_parser's ParserBitrix must give the
+same rows as the BeautifulSoup one. The grid module does not depend on Odoo:
+it is loaded from its file, and these tests run without Odoo nor database:
+
+    python -m pytest tests/test_bitrix_grid_extractor.py
+"""
+import importlib.util
+import os
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_module(name, *path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, os.pardir, 'ata_parser', *path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+grid = load_module('parser_bitrix_grid', 'wizard', 'parser_bitrix_grid.py')
+common = load_module('bench_common', 'benchmarks', 'common.py')
+
+
+def make_cell(value, closed=True):
+    return ('<td class="main-grid-cell"><div class="main-grid-cell-inner">'
+            '<span class="main-grid-cell-content">%s</span></div>%s' % (value, '</td>' if closed else ''))
+
+
+def make_title(value):
+    return ('<th class="main-grid-cell-head"><div class="main-grid-cell-inner">'
+            '<span class="main-grid-cell-head-container"><span class="main-grid-head-title">%s</span>'
+            '</span></div></th>' % value)
+
+
+def make_table(body):
+    return '<html><body><table>%s</table></body></html>' % body
+
+
+# malformed grids, with the rows of the BeautifulSoup backend
+MALFORMED = {
+    'unclosed_cell': (
+        make_table('<tr class="main-grid-row">%s%s</tr>' % (make_cell('A', False), make_cell('B', False))),
+        [['A', 'B']],
+    ),
+    'nested_row': (
+        make_table('<tr class="main-grid-row">%s<td class="main-grid-cell"><table><tr class="main-grid-row">%s'
+                   '</tr></table></td></tr>' % (make_cell('A'), make_cell('B'))),
+        [['A', 'B', 'B'], ['B']],
+    ),
+    'nested_row_in_content': (
+        make_table('<tr class="main-grid-row"><td class="main-grid-cell"><div class="main-grid-cell-inner">'
+                   '<span class="main-grid-cell-content">A<table><tr class="main-grid-row">%s</tr></table>'
+                   '</span></div></td></tr>' % make_cell('B')),
+        [['AB', 'B'], ['B']],
+    ),
+    'unclosed_row': (
+        make_table('<tr class="main-grid-row">%s<tr class="main-grid-row">%s' % (make_cell('A'), make_cell('B'))),
+        [['A', 'B'], ['B']],
+    ),
+    'unclosed_paragraph': (
+        make_table('<tr class="main-grid-row">%s</tr>' % make_cell('<p>A<p>B')),
+        [['AB']],
+    ),
+    'stray_end_tags': (
+        make_table('<tr class="main-grid-row">%s</span></div></td>%s</tr>' % (make_cell('A'), make_cell('B'))),
+        [['A', 'B']],
+    ),
+}
+# libxml2 closes an unclosed row when the next one starts
+LXML_ROWS = {
+    'unclosed_row': [['A'], ['B']],
+}
+
+
+def extract(html, tokenizer):
+    return grid.extract_grid(html, grid.GRID_TAGS, tokenizer=tokenizer)
+
+
+class TestGridExtractor(unittest.TestCase):
+
+    def assertSamePage(self, page, expected):
+        self.assertEqual(page.titles, expected.titles)
+        self.assertEqual(page.rows, expected.rows)
+        self.assertEqual((page.page_count, page.total), (expected.page_count, expected.total))
+
+    def test_synthetic_page(self):
+        if grid.BeautifulSoup is None:
+            self.skipTest("BeautifulSoup is not installed")
+        html = common.make_grid_page(200, start=400, pager=common.make_pager(3, 12, 2400))
+        expected = extract(html, 'bs4')
+        self.assertEqual(len(expected.rows), 200)
+        self.assertEqual((expected.page_count, expected.total), (12, 2400))
+        for tokenizer in ('html.parser', 'lxml'):
+            with self.subTest(tokenizer=tokenizer):
+                self.assertSamePage(extract(html, tokenizer), expected)
+
+    def test_malformed_markup(self):
+        for name, (html, rows) in MALFORMED.items():
+            with self.subTest(name=name):
+                if grid.BeautifulSoup is not None:
+                    self.assertEqual(extract(html, 'bs4').rows, rows)
+                self.assertEqual(extract(html, 'html.parser').rows, rows)
+                self.assertEqual(extract(html, 'lxml').rows, LXML_ROWS.get(name, rows))
+
+    def test_split_text(self):
+        # the tokenizers split text nodes around entities, while a comment
+        # ends a text node: strings are stripped on each side of it
+        html = make_table('<tr class="main-grid-row">%s</tr>' % make_cell('Smith &amp; Co<!-- x --> Ltd'))
+        for tokenizer in ('bs4', 'html.parser', 'lxml') if grid.BeautifulSoup else ('html.parser', 'lxml'):
+            with self.subTest(tokenizer=tokenizer):
+                self.assertEqual(extract(html, tokenizer).rows, [['Smith & CoLtd']])
+
+    def test_blank_titles(self):
+        # BeautifulSoup keeps a text node of whitespace only as '\n' or ' '
+        titles = ['  \n  ', '\t', 'E-Mail', ' <b> </b>\n', '']
+        html = make_table('<tr>%s</tr><tr class="main-grid-row">%s</tr>' % (
+            ''.join(make_title(title) for title in titles), make_cell('A')))
+        expected = ['\n', ' ', 'E-Mail', '  \n', '']
+        for tokenizer in ('bs4', 'html.parser', 'lxml') if grid.BeautifulSoup else ('html.parser', 'lxml'):
+            with self.subTest(tokenizer=tokenizer):
+                self.assertEqual(extract(html, tokenizer).titles, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()